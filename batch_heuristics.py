@@ -0,0 +1,90 @@
+import numpy as np
+from solver import load_wd_table, slide_solved_state, wd_weights
+
+
+class BatchHeuristics:
+    # Scores many boards at once with lookup tables.  Boards are the rows
+    # of an (N, n * n) uint8 array and every method returns N values.  The
+    # values agree with slide_wd's: conflicts are counted per pair of tiles.
+    def __init__(self, n, goal=None):
+        # WD keys are base n + 1 numbers of n * (n - 1) digits held in
+        # uint64, which 7 ** 30 for n = 6 overflows.
+        if not 2 <= n <= 5:
+            raise ValueError('board side must be 2..5')
+        goal = goal or slide_solved_state(n)
+        self.n = n
+        size = n * n
+        self.cells = np.arange(size)
+        goals = np.zeros(size, dtype=np.intp)
+        goals[list(goal)] = self.cells
+        self.goals = goals
+        goal_x, goal_y = goals % n, goals // n
+        x, y = self.cells % n, self.cells // n
+
+        # Tables indexed by [tile, cell]; the blank scores nothing.
+        self.md = abs(goal_x[:, None] - x) + abs(goal_y[:, None] - y)
+        self.md[0] = 0
+        w = np.array(wd_weights(n), dtype=np.uint64)
+        self.ht = w[n * y + goal_y[:, None]]
+        self.vt = w[n * x + goal_x[:, None]]
+        self.ht[0] = self.vt[0] = 0
+
+        # Within a row or column, each tile is coded by its goal's place
+        # in that line (1..n), or 0 when its goal is elsewhere.  The codes
+        # of a line's cells, read as a base n + 1 number, index one table
+        # of conflict counts shared by all lines.
+        lines = [[r * n + c for c in range(n)] for r in range(n)]
+        lines += [[r * n + c for r in range(n)] for c in range(n)]
+        codes = np.zeros((2 * n, size), dtype=np.intp)
+        for r in range(n):
+            codes[r][goal_y == r] = goal_x[goal_y == r] + 1
+            codes[n + r][goal_x == r] = goal_y[goal_x == r] + 1
+        codes[:, 0] = 0
+        powers = (n + 1) ** np.arange(n - 1, -1, -1)
+        # Flattened [line, place, tile] -> the tile's digit at that place.
+        self.digits = (codes[:, None, :] * powers[:, None]).reshape(-1)
+        self.line_cells = np.array(lines).reshape(-1)
+        self.line_base = np.arange(2 * n * n) * size
+        digits = np.indices((n + 1,) * n).reshape(n, -1)
+        count = np.zeros(digits.shape[1], dtype=np.uint8)
+        for i in range(n):
+            for j in range(i + 1, n):
+                count += (digits[j] > 0) & (digits[i] > digits[j])
+        self.line_conflicts = count
+        self.wd = None
+
+    def _boards(self, boards):
+        return np.asarray(boards, dtype=np.uint8).reshape(
+            -1, self.n * self.n).astype(np.intp)
+
+    def manhattan(self, boards):
+        b = self._boards(boards)
+        return self.md[b, self.cells].sum(axis=1)
+
+    def conflicts(self, boards):
+        b = self._boards(boards)
+        return self._conflicts(b)
+
+    def _conflicts(self, b):
+        n = self.n
+        index = np.take(self.digits, b[:, self.line_cells] + self.line_base)
+        index = index.reshape(len(b), 2 * n, n).sum(axis=2)
+        return 2 * np.take(self.line_conflicts, index).sum(axis=1)
+
+    def linear_conflict(self, boards):
+        b = self._boards(boards)
+        return self.md[b, self.cells].sum(axis=1) + self._conflicts(b)
+
+    def walking_distance(self, boards):
+        if self.wd is None:
+            table = load_wd_table(self.n)
+            self.wd = (np.asarray(table.keys, dtype=np.uint64),
+                       np.frombuffer(table.dist, dtype=np.uint8))
+        keys, dist = self.wd
+        b = self._boards(boards)
+        ht = self.ht[b, self.cells].sum(axis=1, dtype=np.uint64)
+        vt = self.vt[b, self.cells].sum(axis=1, dtype=np.uint64)
+        return dist[np.searchsorted(keys, ht)].astype(np.intp) + \
+            dist[np.searchsorted(keys, vt)] + self._conflicts(b)
+
+    __call__ = walking_distance
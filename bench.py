@@ -0,0 +1,284 @@
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from operator import eq
+from fsm import slide_automaton
+from instrument import SolveStats
+from solver import (IDAStar, IncrementalIDAStar, PackedIDAStar,
+                    PerimeterIDAStar, StackIDAStar, TTIDAStar,
+                    slide_is_solvable, slide_perimeter, slide_neighbours,
+                    slide_packed_neighbours, slide_packed_wd,
+                    slide_solved_state, slide_wd)
+
+
+INSTANCES = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'bench_instances.json')
+
+
+# Instances from Korf's 100 (Korf 1985), in his layout and numbering, with
+# their optimal lengths.  A subset: only those checked here are included,
+# by solving them with stack-fsm-plain-wd (walking distance alone, which
+# is admissible) to the published length.  Runs report the lengths that
+# differ from it, which the default walking distance plus linear
+# conflicts now and then gives.
+KORF = {
+    1: ((14, 13, 15, 7, 11, 12, 9, 5, 6, 0, 2, 1, 4, 8, 10, 3), 57),
+    2: ((13, 5, 4, 10, 9, 12, 8, 14, 2, 3, 7, 1, 0, 15, 11, 6), 55),
+    3: ((14, 7, 8, 2, 13, 11, 10, 4, 9, 12, 5, 0, 3, 6, 1, 15), 59),
+    4: ((5, 12, 10, 7, 15, 11, 14, 0, 8, 2, 1, 13, 3, 4, 9, 6), 56),
+    5: ((4, 7, 14, 13, 10, 3, 9, 12, 11, 5, 6, 15, 1, 2, 8, 0), 56),
+    6: ((14, 7, 1, 9, 12, 3, 6, 15, 8, 11, 2, 5, 10, 0, 4, 13), 52),
+    7: ((2, 11, 15, 5, 13, 4, 6, 7, 12, 8, 10, 1, 9, 3, 14, 0), 52),
+    8: ((12, 11, 15, 3, 8, 0, 4, 2, 6, 13, 9, 5, 14, 1, 10, 7), 50),
+    9: ((3, 14, 9, 11, 5, 4, 8, 2, 13, 12, 6, 7, 10, 1, 15, 0), 46),
+    10: ((13, 11, 8, 9, 0, 15, 7, 10, 4, 3, 6, 14, 5, 12, 2, 1), 59),
+    11: ((5, 9, 13, 14, 6, 3, 7, 12, 10, 8, 4, 0, 15, 2, 11, 1), 57),
+    12: ((14, 1, 9, 6, 4, 8, 12, 5, 7, 2, 3, 0, 10, 11, 13, 15), 45),
+    13: ((3, 6, 5, 2, 10, 0, 15, 14, 1, 4, 13, 12, 9, 8, 11, 7), 46),
+    22: ((14, 10, 9, 4, 13, 6, 5, 8, 2, 12, 7, 0, 1, 3, 11, 15), 59),
+    43: ((14, 9, 12, 13, 15, 4, 8, 10, 0, 2, 1, 7, 3, 11, 5, 6), 64),
+    57: ((7, 1, 2, 4, 8, 3, 6, 11, 10, 15, 0, 5, 14, 12, 13, 9), 50),
+    58: ((7, 3, 1, 13, 12, 10, 5, 2, 8, 0, 6, 11, 14, 15, 4, 9), 51),
+    73: ((12, 3, 9, 1, 4, 5, 10, 2, 6, 11, 15, 0, 14, 7, 13, 8), 49),
+}
+
+
+def _pdb_engine(n):
+    from pattern_db import slide_pdb
+    return IDAStar(slide_pdb(n, slide_solved_state(n)), slide_neighbours(n))
+
+
+VARIANTS = {
+    'idastar-wd': lambda n: IDAStar(
+        slide_wd(n, slide_solved_state(n)), slide_neighbours(n)),
+    'incremental-wd': lambda n: IncrementalIDAStar(
+        slide_wd(n, slide_solved_state(n)), slide_neighbours(n)),
+    'packed-wd': lambda n: PackedIDAStar(
+        slide_packed_wd(n, slide_solved_state(n)),
+        slide_packed_neighbours(n)),
+    'stack-wd': lambda n: StackIDAStar(
+        slide_wd(n, slide_solved_state(n)), n),
+    'stack-fsm-wd': lambda n: StackIDAStar(
+        slide_wd(n, slide_solved_state(n)), n, slide_automaton(n)),
+    'stack-fsm-plain-wd': lambda n: StackIDAStar(
+        slide_wd(n, slide_solved_state(n), conflicts=False), n,
+        slide_automaton(n)),
+    'tt-wd': lambda n: TTIDAStar(
+        slide_wd(n, slide_solved_state(n)), slide_neighbours(n)),
+    'tt-two-tier-wd': lambda n: TTIDAStar(
+        slide_wd(n, slide_solved_state(n)), slide_neighbours(n),
+        policy='two-tier'),
+    'perimeter-wd': lambda n: PerimeterIDAStar(
+        slide_wd(n, slide_solved_state(n)), slide_neighbours(n),
+        slide_perimeter(n)),
+    'idastar-pdb': _pdb_engine,
+}
+
+
+def korf_to_goal(p):
+    # Korf's boards are solved with the blank top left and tile t on cell
+    # t.  Turning the board half round and renaming tile t to 16 - t maps
+    # that goal onto this one, and keeps every distance.
+    return tuple(16 - t if t else 0 for t in reversed(p))
+
+
+def random_walk(rng, n, length):
+    neighbours = slide_neighbours(n)
+    p = slide_solved_state(n)
+    last = 0
+    for _ in range(length):
+        p, last = rng.choice([(c, m) for _, c, (_, m) in neighbours(p)
+                              if m != -last])
+    return p
+
+
+def random_board(rng, n):
+    while True:
+        p = list(range(n * n))
+        rng.shuffle(p)
+        if slide_is_solvable(p):
+            return tuple(p)
+
+
+def generate_instances(seed=15):
+    rng = random.Random(seed)
+    return {
+        'easy': [random_walk(rng, 4, 30) for _ in range(10)],
+        'medium': [random_walk(rng, 4, 80) for _ in range(10)],
+        'hard': [random_board(rng, 4) for _ in range(10)],
+        'korf': [korf_to_goal(p) for p, _ in KORF.values()],
+    }
+
+
+def load_instances(name):
+    with open(INSTANCES) as f:
+        return [tuple(p) for p in json.load(f)[name]]
+
+
+def run_instance(variant, board, stats=False):
+    n = int(len(board) ** 0.5)
+    engine = VARIANTS[variant](n)
+    is_goal = partial(eq, slide_solved_state(n))
+    if stats:
+        # Timing h and neighbours slows the solve down, so these runs are
+        # for looking inside a variant rather than for comparing times.
+        solve_stats = SolveStats()
+        start = time.perf_counter()
+        _, moves, _, nodes = solve_stats.solve(engine, board, is_goal)
+    else:
+        start = time.perf_counter()
+        _, moves, _, nodes = engine.solve(board, is_goal)
+    elapsed = time.perf_counter() - start
+    result = {
+        'variant': variant,
+        'board': board,
+        'length': len(moves),
+        'nodes': nodes,
+        'time': elapsed,
+        'nodes_per_sec': nodes / elapsed if elapsed else None,
+        # Each instance runs in a fresh process, so this is its own peak.
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+    if stats:
+        result['stats'] = solve_stats.to_dict()
+    return result
+
+
+def summarize(results):
+    summary = {}
+    for r in results:
+        s = summary.setdefault(r['variant'], {'instances': 0, 'time': 0,
+                                              'nodes': 0, 'length': 0,
+                                              'peak_rss_kb': 0})
+        s['instances'] += 1
+        s['time'] += r['time']
+        s['nodes'] += r['nodes']
+        s['length'] += r['length']
+        s['peak_rss_kb'] = max(s['peak_rss_kb'], r['peak_rss_kb'])
+        if 'optimal' in r:
+            s['not_optimal'] = (s.get('not_optimal', 0) +
+                                (r['length'] != r['optimal']))
+    for s in summary.values():
+        s['nodes_per_sec'] = s['nodes'] / s['time'] if s['time'] else None
+        s['mean_length'] = s['length'] / s['instances']
+        del s['length']
+    return summary
+
+
+def run(instance_set, variants, stats=False):
+    boards = load_instances(instance_set)
+    results = []
+    # Tables are built up front so that no instance is charged for them.
+    for variant in variants:
+        VARIANTS[variant](4)
+    known = list(KORF.items()) if instance_set == 'korf' else None
+    for variant in variants:
+        for i, board in enumerate(boards):
+            # A pool per instance rather than max_tasks_per_child=1, which
+            # needs Python 3.11.
+            with ProcessPoolExecutor(1) as pool:
+                r = pool.submit(run_instance, variant, board, stats).result()
+            r['instance'] = i
+            if known is not None:
+                r['korf'], (_, r['optimal']) = known[i]
+            results.append(r)
+            line = (f"{variant} #{i}: {r['length']} moves, "
+                    f"{r['nodes']} nodes, {r['time']:.2f}s")
+            if known is not None and r['length'] != r['optimal']:
+                line += (f" -- not optimal, Korf #{r['korf']} takes "
+                         f"{r['optimal']}")
+            print(line, file=sys.stderr)
+    summary = summarize(results)
+    for variant, s in summary.items():
+        if s.get('not_optimal'):
+            print(f"{variant}: {s['not_optimal']} of {s['instances']} "
+                  f"lengths are not optimal", file=sys.stderr)
+    return {
+        'set': instance_set,
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+        'summary': summary,
+    }
+
+
+def compare(base, new, threshold):
+    regressions = []
+    base_results = {(r['variant'], r['instance']): r for r in base['results']}
+    for r in new['results']:
+        b = base_results.get((r['variant'], r['instance']))
+        if b is None:
+            continue
+        where = f"{r['variant']} #{r['instance']}"
+        if r['length'] != b['length']:
+            regressions.append(f"{where}: solution length {b['length']} -> "
+                               f"{r['length']}")
+        if r['nodes'] > b['nodes'] * (1 + threshold):
+            regressions.append(f"{where}: nodes {b['nodes']} -> "
+                               f"{r['nodes']}")
+        # Very short runs are mostly timer noise.
+        if b['time'] > 0.05 and r['time'] > b['time'] * (1 + threshold):
+            regressions.append(f"{where}: time {b['time']:.3f}s -> "
+                               f"{r['time']:.3f}s")
+    for variant, s in new['summary'].items():
+        b = base['summary'].get(variant)
+        if b and b['nodes_per_sec'] and s['nodes_per_sec'] and \
+                s['nodes_per_sec'] < b['nodes_per_sec'] * (1 - threshold):
+            regressions.append(f"{variant}: nodes/sec "
+                               f"{b['nodes_per_sec']:.0f} -> "
+                               f"{s['nodes_per_sec']:.0f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Solver benchmarks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    p = commands.add_parser('run')
+    p.add_argument('--set', default='easy',
+                   choices=['easy', 'medium', 'hard', 'korf'])
+    p.add_argument('--variant', action='append', choices=sorted(VARIANTS),
+                   help='may be repeated; all variants by default')
+    p.add_argument('-o', '--output', default='-')
+    p.add_argument('--stats', action='store_true',
+                   help='record per-iteration solver statistics')
+    p = commands.add_parser('compare')
+    p.add_argument('base')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=0.1)
+    p = commands.add_parser('generate')
+    p.add_argument('--seed', type=int, default=15)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        report = run(args.set, args.variant or sorted(VARIANTS), args.stats)
+        out = sys.stdout if args.output == '-' else open(args.output, 'w')
+        json.dump(report, out, indent=1)
+        out.write('\n')
+    elif args.command == 'compare':
+        with open(args.base) as f:
+            base = json.load(f)
+        with open(args.new) as f:
+            new = json.load(f)
+        regressions = compare(base, new, args.threshold)
+        for r in regressions:
+            print(r)
+        sys.exit(1 if regressions else 0)
+    else:
+        sets = generate_instances(args.seed)
+        with open(INSTANCES, 'w') as f:
+            f.write('{\n' + ',\n'.join(
+                f' "{name}": [\n' + ',\n'.join(
+                    '  ' + json.dumps(p) for p in boards) + '\n ]'
+                for name, boards in sets.items()) + '\n}\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+from solver import slide_solved_state
+
+
+class Board:
+    # Tiles by cell, 0 for the blank.  Moves are named after the way the
+    # blank goes and are applied by index arithmetic.  `where` maps tiles
+    # to cells and `misplaced` counts tiles off their goal cell, so finding
+    # a tile and telling a win are O(1) too.
+    def __init__(self, n, tiles=None):
+        self.n = n
+        self.tiles = list(tiles or slide_solved_state(n))
+        self.where = [0] * (n * n)
+        for i, t in enumerate(self.tiles):
+            self.where[t] = i
+        self.blank = self.where[0]
+        self.misplaced = sum(1 for i, t in enumerate(self.tiles)
+                             if t and t != i + 1)
+        self.steps = {'left': -1, 'right': 1, 'up': -n, 'down': n}
+
+    def __iter__(self):
+        return iter(self.tiles)
+
+    def solved(self):
+        return self.misplaced == 0
+
+    def can_move(self, direction):
+        n, x, y = self.n, self.blank % self.n, self.blank // self.n
+        return {'left': x > 0, 'right': x < n - 1,
+                'up': y > 0, 'down': y < n - 1}[direction]
+
+    def source(self, direction):
+        # The cell of the tile that moving the blank this way would slide.
+        return self.blank + self.steps[direction]
+
+    def move(self, direction):
+        # Slides the tile on the blank's `direction` side into the blank
+        # and returns it.
+        if not self.can_move(direction):
+            raise ValueError(f'cannot move the blank {direction}')
+        src = self.blank + self.steps[direction]
+        dst = self.blank
+        t = self.tiles[src]
+        self.misplaced += (t != dst + 1) - (t != src + 1)
+        self.tiles[dst] = t
+        self.tiles[src] = 0
+        self.where[t] = dst
+        self.where[0] = src
+        self.blank = src
+        return t
+
+    def direction_to(self, i):
+        # The way the blank must go to slide the tile at cell i, or None
+        # when that tile is not next to the blank.
+        for direction, step in self.steps.items():
+            if self.blank + step == i and self.can_move(direction):
+                return direction
+        return None
@@ -0,0 +1,123 @@
+import json
+import os
+from collections import deque
+from solver import cache_path, write_cache_file
+
+
+# Blank moves, in the order strings of equal length are ranked.
+STEPS = {'l': (-1, 0), 'r': (1, 0), 'u': (0, -1), 'd': (0, 1)}
+
+
+def learn_duplicates(n, depth):
+    # Blank move strings of up to `depth` moves that never need searching
+    # on an n x n board, after Taylor & Korf.  Strings are tried breadth
+    # first, shortest and then alphabetically first, on an unbounded board
+    # from a fixed start.  A string reaching the same position as an
+    # earlier one is pruned when the earlier string's blank stays inside
+    # the pruned one's bounding box: wherever the pruned string fits on
+    # the board, the earlier one does too and can stand in for it.
+    # Tiles are named after their starting cells.  Strings ending in a
+    # pruned string are never searched and are skipped outright.
+    seen = {((0, 0), frozenset()): [(0, 0, 0, 0)]}
+    live = [('', (0, 0), {}, (0, 0, 0, 0))]
+    pruned = set()
+    for _ in range(depth):
+        level = []
+        for s, (x, y), moved, box in live:
+            for d, (dx, dy) in STEPS.items():
+                bx, by = x + dx, y + dy
+                x0, x1 = min(box[0], bx), max(box[1], bx)
+                y0, y1 = min(box[2], by), max(box[3], by)
+                if x1 - x0 >= n or y1 - y0 >= n:
+                    # Too wide or tall to be played on this board.
+                    continue
+                t = s + d
+                if any(t[i:] in pruned for i in range(1, len(t))):
+                    continue
+                child = dict(moved)
+                tile = child.pop((bx, by), (bx, by))
+                if tile != (x, y):
+                    child[(x, y)] = tile
+                child_box = (x0, x1, y0, y1)
+                key = ((bx, by), frozenset(child.items()))
+                others = seen.setdefault(key, [])
+                if any(x0 <= b[0] and b[1] <= x1 and y0 <= b[2] and
+                       b[3] <= y1 for b in others):
+                    pruned.add(t)
+                    continue
+                others.append(child_box)
+                level.append((t, (bx, by), child, child_box))
+        live = level
+    return sorted(pruned, key=lambda t: (len(t), t))
+
+
+def build_automaton(patterns):
+    # Aho-Corasick automaton over blank moves that rejects every string
+    # containing a pattern.  Returns rows of next states, one per move in
+    # STEPS order, with -1 for moves into a rejected string.
+    alphabet = list(STEPS)
+    goto = [{}]
+    accept = [False]
+    for p in patterns:
+        state = 0
+        for c in p:
+            if c not in goto[state]:
+                goto.append({})
+                accept.append(False)
+                goto[state][c] = len(goto) - 1
+            state = goto[state][c]
+        accept[state] = True
+
+    fail = [0] * len(goto)
+    delta = [None] * len(goto)
+    delta[0] = {c: goto[0].get(c, 0) for c in alphabet}
+    queue = deque(goto[0].values())
+    while queue:
+        state = queue.popleft()
+        accept[state] = accept[state] or accept[fail[state]]
+        delta[state] = {}
+        for c in alphabet:
+            if c in goto[state]:
+                child = goto[state][c]
+                fail[child] = delta[fail[state]][c]
+                delta[state][c] = child
+                queue.append(child)
+            else:
+                delta[state][c] = delta[fail[state]][c]
+
+    # Rejected states are dropped and the rest renumbered.
+    number = {}
+    for state in range(len(goto)):
+        if not accept[state]:
+            number[state] = len(number)
+    return [[number.get(delta[state][c], -1) for c in alphabet]
+            for state in number]
+
+
+class SlideAutomaton:
+    # Transitions by blank move offset (-1, 1, -n, n) for StackIDAStar;
+    # state 0 is the start and -1 marks a pruned move.
+    def __init__(self, n, rows):
+        self.n = n
+        self.rows = rows
+        offsets = [-1, 1, -n, n]
+        self.table = [dict(zip(offsets, row)) for row in rows]
+
+    def __len__(self):
+        return len(self.rows)
+
+
+_automata = {}
+
+
+def slide_automaton(n, depth=12):
+    if (n, depth) not in _automata:
+        path = cache_path(f'fsm-{n}-{depth}.json')
+        if os.path.exists(path):
+            with open(path) as f:
+                rows = json.load(f)
+        else:
+            rows = build_automaton(learn_duplicates(n, depth))
+            write_cache_file(path, lambda f: json.dump(rows, f), 'w')
+        _automata[n, depth] = SlideAutomaton(n, rows)
+    return _automata[n, depth]
@@ -1,9 +1,21 @@
 import tkinter as tk
+import tkinter.font as tkfont
 import random
 import time
+import os
 import pickle
-from operator import itemgetter
-from solver import IDAStar, slide_solved_state, slide_neighbours, slide_wd
+import sqlite3
+from functools import partial
+from operator import eq
+from solver import (AnytimeIDAStar, SolveCancelled, SolveTimeout,
+                    slide_solved_state)
+from parallel import ParallelIDAStar, slide_engine
+from board import Board
+from generator import random_board
+from solution_cache import CachedSolver
+from service import ENV as SERVICE_ENV, SolverClient
+from session import SolverSession
+from hints import HintEngine
 import threading
 
 
@@ -28,33 +40,80 @@ class SaveThread(threading.Thread):
 
 
 class Records():
-    def __init__(self):
-        self.data = {'moves': [], 'time': []}
-        self.load()
-
-    def save(self):
-        self.sort_records()
-        with open('records.pickle', 'wb') as f:
-            pickle.dump(self.data, f)
-
-    def load(self):
-        try:
-            with open('records.pickle', 'rb') as f:
-                self.data = pickle.load(f)
-        except IOError:
-            self.data = {'moves': [], 'time': []}
-
-    def sort_records(self):
-        self.data['time'] = sorted(self.data['time'],
-                                   key=itemgetter('time', 'moves'))
-        self.data['moves'] = sorted(self.data['moves'],
-                                    key=itemgetter('moves', 'time'))
-        self.data['time'] = self.data['time'][:10]
-        self.data['moves'] = self.data['moves'][:10]
+    # Every result is one row of an SQLite table, written in its own
+    # transaction, so a crash never loses earlier records.  Queries read
+    # only the rows they need through the indexes on (size, seconds) and
+    # (size, moves).
+    order = {'time': 'seconds, moves', 'moves': 'moves, seconds'}
+
+    def __init__(self, path='records.db', legacy='records.pickle'):
+        self.db = sqlite3.connect(path)
+        with self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS records ('
+                            'id INTEGER PRIMARY KEY, size INTEGER NOT NULL, '
+                            'board TEXT, moves INTEGER NOT NULL, '
+                            'seconds REAL NOT NULL, time TEXT NOT NULL, '
+                            'created REAL NOT NULL)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS records_time '
+                            'ON records (size, seconds, moves)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS records_moves '
+                            'ON records (size, moves, seconds)')
+            self.db.execute('CREATE INDEX IF NOT EXISTS records_board '
+                            'ON records (board)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS migrations ('
+                            'name TEXT PRIMARY KEY)')
+        if os.path.exists(legacy):
+            self.migrate(legacy)
+
+    def migrate(self, legacy):
+        # The old pickle kept the same record objects in both top 10
+        # lists; they were all from 4x4 games.  The import is noted in the
+        # same transaction as its rows, so a file left behind by a crash
+        # before the rename is not imported twice.
+        name = os.path.basename(legacy)
+        done = self.db.execute('SELECT 1 FROM migrations WHERE name=?',
+                               (name,)).fetchone()
+        if not done:
+            with open(legacy, 'rb') as f:
+                data = pickle.load(f)
+            old = {id(r): r for r in data['time'] + data['moves']}
+            with self.db:
+                self.db.execute('INSERT INTO migrations VALUES (?)', (name,))
+                for r in old.values():
+                    h, m, s = r['time'].split(':')
+                    self.db.execute(
+                        'INSERT INTO records (size, moves, seconds, time, '
+                        'created) VALUES (4, ?, ?, ?, 0)',
+                        (r['moves'], int(h) * 3600 + int(m) * 60 + float(s),
+                         r['time']))
+        os.replace(legacy, legacy + '.migrated')
+
+    def add(self, size, board, moves, seconds, time_text):
+        with self.db:
+            self.db.execute(
+                'INSERT INTO records (size, board, moves, seconds, time, '
+                'created) VALUES (?, ?, ?, ?, ?, ?)',
+                (size, board and ' '.join(map(str, board)), moves, seconds,
+                 time_text, time.time()))
+
+    def top(self, param='time', size=4, limit=10):
+        rows = self.db.execute(
+            'SELECT moves, time FROM records WHERE size=? ORDER BY '
+            f'{self.order[param]} LIMIT ?', (size, limit))
+        return [{'moves': m, 'time': t} for m, t in rows]
+
+    def for_board(self, board, param='time', limit=10):
+        rows = self.db.execute(
+            'SELECT moves, time FROM records WHERE board=? ORDER BY '
+            f'{self.order[param]} LIMIT ?',
+            (' '.join(map(str, board)), limit))
+        return [{'moves': m, 'time': t} for m, t in rows]
 
 
 class Cell():
-    def __init__(self, canvas, size, color, number, x, y, fn):
+    # A tile's rectangle and number, both tagged 'tile'.  The items live as
+    # long as the cell; the font is shared by all tiles.
+    def __init__(self, canvas, size, color, number, x, y, fn, font):
         self.cell_id = None
         self.text_id = None
         self.canvas = canvas
@@ -64,53 +123,168 @@ class Cell():
         self.x = x * self.size
         self.y = y * self.size
         self.fn = fn
+        self.font = font
         self.create()
 
     def create(self):
         self.cell_id = self.canvas.create_rectangle(
             self.x, self.y, self.x + self.size, self.y + self.size,
-            fill=self.color)
+            fill=self.color, tags='tile')
         self.text_id = self.canvas.create_text(
             self.x + self.size // 2, self.y + self.size // 2,
-            text=self.number, justify=tk.CENTER,
-            font=f"Consolas {self.size // 3}")
+            text=self.number, justify=tk.CENTER, font=self.font, tags='tile')
         self.canvas.tag_bind(self.cell_id, "<Button-1>", self.fn)
         self.canvas.tag_bind(self.text_id, "<Button-1>", self.fn)
 
-    def move(self, direction):
-        delta = {'left': [-self.size, 0], 'right': [self.size, 0],
-                 'up': [0, -self.size], 'down': [0, self.size]}
-
-        self.canvas.move(self.cell_id, *delta[direction])
-        self.canvas.move(self.text_id, *delta[direction])
-        self.x, self.y, *_ = self.canvas.coords(self.cell_id)
+    def place(self, x, y):
+        self.x, self.y = x, y
+        self.canvas.coords(self.cell_id, x, y, x + self.size, y + self.size)
+        self.canvas.coords(self.text_id, x + self.size // 2,
+                           y + self.size // 2)
 
     def resize(self, new_size, x, y):
         self.size = new_size
-        self.x = x * self.size
-        self.y = y * self.size
-        font_size = self.size // 3
-        self.canvas.coords(self.cell_id, self.x, self.y,
-                           self.x + self.size, self.y + self.size)
-        self.canvas.coords(self.text_id, self.x + self.size // 2,
-                           self.y + self.size // 2)
-        self.canvas.itemconfigure(self.text_id, font=f"Consolas {font_size}")
+        self.place(x * self.size, y * self.size)
+
+    def recolor(self, color):
+        self.color = color
+        self.canvas.itemconfigure(self.cell_id, fill=color)
+
+
+class Playback():
+    # Plays a solution on the main loop, one frame every `frame` ms.  The
+    # tile being moved is drawn part way between its two cells.  Moves that
+    # end within the same frame are applied together, and each tile they
+    # touch is drawn once, at its final cell.
+    frame = 16
+    opposite = {'left': 'right', 'right': 'left', 'up': 'down', 'down': 'up'}
+
+    def __init__(self, app, moves, speed=4, done=None):
+        self.app = app
+        self.moves = moves
+        self.speed = speed
+        self.done = done
+        self.index = 0
+        self.phase = 0
+        self.paused = False
+        self.job = None
+        self.last = None
+
+    def start(self):
+        self.paused = False
+        self.last = time.monotonic()
+        self.job = self.app.after(self.frame, self.tick)
+
+    def tick(self):
+        now = time.monotonic()
+        self.phase += (now - self.last) * self.speed
+        self.last = now
+        touched = set()
+        while self.phase >= 1 and self.index < len(self.moves):
+            self.phase -= 1
+            touched.add(self._forward())
+        self.job = None
+        self.draw(touched)
+        if not self._finished():
+            self.job = self.app.after(self.frame, self.tick)
+
+    def draw(self, touched):
+        app = self.app
+        board = app.board
+        for tile in touched:
+            app.cells[tile].place(*app.cell_origin(board.where[tile]))
+        if self.phase and self.index < len(self.moves):
+            src = board.source(self.moves[self.index])
+            x0, y0 = app.cell_origin(src)
+            x1, y1 = app.cell_origin(board.blank)
+            app.cells[board.tiles[src]].place(x0 + (x1 - x0) * self.phase,
+                                              y0 + (y1 - y0) * self.phase)
+
+    def _forward(self):
+        tile = self.app.board.move(self.moves[self.index])
+        self.index += 1
+        self.app.moves += 1
+        return tile
+
+    def _backward(self):
+        self.index -= 1
+        self.app.moves -= 1
+        return self.app.board.move(self.opposite[self.moves[self.index]])
+
+    def _finished(self):
+        if self.index < len(self.moves):
+            return False
+        self.pause()
+        if self.done is not None:
+            self.done()
+        return True
+
+    def pause(self):
+        self.paused = True
+        if self.job is not None:
+            self.app.after_cancel(self.job)
+            self.job = None
+
+    def toggle(self):
+        if self.paused:
+            self.start()
+        else:
+            self.pause()
+
+    def seek(self, index):
+        # Jumps to the position after `index` moves and stays paused.
+        self.pause()
+        touched = set()
+        if self.phase and self.index < len(self.moves):
+            # The tile half way through its move goes back to its cell.
+            board = self.app.board
+            touched.add(board.tiles[board.source(self.moves[self.index])])
+        self.phase = 0
+        index = max(0, min(index, len(self.moves)))
+        while self.index < index:
+            touched.add(self._forward())
+        while self.index > index:
+            touched.add(self._backward())
+        self.draw(touched)
+        self._finished()
+
+    def step_forward(self):
+        self.seek(self.index + 1)
+
+    def step_back(self):
+        self.seek(self.index - 1)
+
+    def rewind(self):
+        self.seek(0)
+
+    def skip(self):
+        self.seek(len(self.moves))
+
+    def faster(self):
+        self.speed = min(self.speed * 2, 256)
+
+    def slower(self):
+        self.speed = max(self.speed / 2, 0.5)
 
 
 class Application(tk.Frame):
+    # Seconds the quick solve runs before settling for its best solution.
+    quick_time_limit = 60
 
     def __init__(self, *args, **kwargs):
         tk.Frame.__init__(self, *args, **kwargs)
 
         # ---------------------Variables-------------------------
         self.cell_size = 150
-        self.cells = []
+        self.side = 4
+        self.board_size = tk.IntVar(value=4)
+        self.tile_size = self.cell_size
+        self.board = None
+        self.cells = {}
         self.colors = ["green", "lightgreen", "gray", "silver",
                        "spring green", "rosybrown", "lawngreen", "deep pink",
                        "cyan", "lightblue", "lime", "violet",
                        "gold", "orange", "firebrick1", "deepskyblue"]
-        self.numbers = [str(i) for i in range(1, 16)]
-        self.freecell = None
         self.moves = 0
         self.start_time = None
         self.finish_time = None
@@ -119,9 +293,31 @@ class Application(tk.Frame):
         self.is_play = False
         self.is_pause = False
         self.records = Records()
+        self.session = SolverSession()
+        self.solution_cache = self.session.cache
+        self.speculation = None
+        self.hints = None
         self.is_solving = False
         self.is_solve = False
         self.s_moves = []
+        self.heuristic = tk.StringVar(value='wd')
+        self.s_heuristic = 'wd'
+        self.parallel = tk.BooleanVar(value=False)
+        self.s_parallel = False
+        self.s_cancel = None
+        self.s_progress = None
+        self.s_result = None
+        self.quick = tk.BooleanVar(value=False)
+        self.s_quick = False
+        self.s_best = None
+        self.s_show_now = False
+        self.s_error = None
+        self.playback = None
+        self.start_board = None
+        self.screens = {}
+        self.buttons = {}
+        self.fonts = {}
+        self.tile_font = None
 
         # -----------------------Widgets-------------------------
         mainmenu = tk.Menu(root)
@@ -132,25 +328,62 @@ class Application(tk.Frame):
                              command=lambda: self.resize(self.cell_size - 25))
         gamemenu.add_command(label="Increase cell size",
                              command=lambda: self.resize(self.cell_size + 25))
+        sizemenu = tk.Menu(gamemenu, tearoff=0)
+        for side in range(3, 11):
+            sizemenu.add_radiobutton(label=f"{side}x{side}",
+                                     variable=self.board_size, value=side,
+                                     command=self.change_board_size)
+        gamemenu.add_cascade(label="Board size", menu=sizemenu)
         gamemenu.add_command(label="Solve", command=self.solve)
+        gamemenu.add_command(label="Hint", accelerator='h',
+                             command=self.show_hint)
+        root.bind('<h>', self.show_hint)
+        heuristicmenu = tk.Menu(gamemenu, tearoff=0)
+        heuristicmenu.add_radiobutton(label="Walking distance",
+                                      variable=self.heuristic, value='wd')
+        heuristicmenu.add_radiobutton(label="Pattern database",
+                                      variable=self.heuristic, value='pdb')
+        gamemenu.add_cascade(label="Solver heuristic", menu=heuristicmenu)
+        gamemenu.add_checkbutton(label="Solve on all CPU cores",
+                                 variable=self.parallel)
+        gamemenu.add_checkbutton(label="Quick solve, then improve",
+                                 variable=self.quick)
         gamemenu.add_command(label="Exit", command=lambda: root.destroy())
+        playmenu = tk.Menu(mainmenu, tearoff=0)
+        for label, action, key in [("Pause/Resume", 'toggle', 'space'),
+                                   ("Step forward", 'step_forward', 'Right'),
+                                   ("Step back", 'step_back', 'Left'),
+                                   ("Faster", 'faster', 'plus'),
+                                   ("Slower", 'slower', 'minus'),
+                                   ("Back to start", 'rewind', 'Home'),
+                                   ("Skip to end", 'skip', 'End')]:
+            playmenu.add_command(label=label, accelerator=key,
+                                 command=partial(self.control_playback,
+                                                 action))
+            root.bind(f'<{key}>', partial(self.control_playback, action))
         infomenu = tk.Menu(mainmenu, tearoff=0)
         infomenu.add_command(label="Records", command=self.show_records)
         infomenu.add_command(label="About", command=self.show_about)
         mainmenu.add_cascade(label="Game", menu=gamemenu)
+        mainmenu.add_cascade(label="Playback", menu=playmenu)
         mainmenu.add_cascade(label="Info", menu=infomenu)
 
         self.canvas = tk.Canvas(root, width=4 * self.cell_size,
                                 height=4 * self.cell_size, bg='white')
         self.canvas.pack()
+        # Every text and button uses one of these; resizing configures
+        # them rather than each item.
+        self.fonts = {num: tkfont.Font(family='Consolas', size=self._size(num))
+                      for num in (6, 7, 10)}
+        self.tile_font = tkfont.Font(family='Consolas',
+                                     size=self.tile_size // 3)
+        self.build_screens()
 
         # ------------------------Start--------------------------
         self.show_start_screen()
 
     # -------------------------Start Methods----------------------------
     def set_start_values(self):
-        self.cells = []
-        self.canvas.delete('all')
         self.moves = 0
         self.start_time = None
         self.finish_time = None
@@ -158,85 +391,75 @@ class Application(tk.Frame):
         self.str_time = None
         self.is_solving = False
         self.is_solve = False
+        self.is_pause = False
         self.s_moves = []
 
     def create_cells(self):
         if self.is_solving:
             return
-        freecell = False
-        freecell_row = None
-        numbers = self.numbers[:]
+        side = self.side
+        # The board is drawn only once it is known to be solvable.
+        board = random_board(side)
         self.set_start_values()
-        for i in range(0, 16):
-            if (random.randint(0, 5000) > 4000 or i == 15) and not freecell:
-                self.add_freecell(i % 4, i // 4)
-                freecell = True
-                freecell_row = i // 4 + 1
+        self.start_board = board
+        self.board = Board(side, board)
+        self.hints = HintEngine(side, self.solution_cache)
+        if len(self.cells) != side * side - 1:
+            self.canvas.delete('tile')
+            self.cells = {}
+        for i, number in enumerate(board):
+            if not number:
+                continue
+            color = random.choice(self.colors)
+            cell = self.cells.get(number)
+            if cell is None:
+                self.cells[number] = Cell(self.canvas, self.tile_size, color,
+                                          str(number), i % side, i // side,
+                                          self.click_on_cell, self.tile_font)
             else:
-                number = numbers.pop(random.randint(0, len(numbers) - 1))
-                self.cells.append(Cell(self.canvas, self.cell_size,
-                                       random.choice(self.colors),
-                                       number, i % 4, i // 4,
-                                       self.click_on_cell))
-
-        if not self.test_puzzle(freecell_row):
-            self.create_cells()
-        else:
-            self.start_time = time.time()
-            self.is_play = True
-
-    def add_freecell(self, row, col):
-        self.cells.append(0)
-        self.freecell = [self._size(1, row), self._size(1, col),
-                         self._size(1, row + 1), self._size(1, col + 1)]
-
-    def test_puzzle(self, fcr):
-        even = 0
-        for i, item in enumerate(self.cells):
-            for j, item in enumerate(self.cells):
-                if j > i:
-                    if self.cells[j] != 0 and self.cells[i] != 0:
-                        if (int(self.cells[i].number) >
-                            int(self.cells[j].number)):
-                                even += 1
-        even += fcr
-        if even % 2 != 0:
-            return False
-        return True
+                cell.recolor(color)
+                cell.place(*self.cell_origin(i))
+        self.show_board()
+        self.start_time = time.time()
+        self.is_play = True
+        self.speculate()
 
     # -----------------------Service Methods----------------------------
     def _size(self, num, mul=1):
         return self.cell_size // num * mul
 
+    def change_board_size(self):
+        if self.is_solving:
+            self.board_size.set(self.side)
+            return
+        self.side = self.board_size.get()
+        self.tile_size = self.cell_size * 4 // self.side
+        self.tile_font.configure(size=self.tile_size // 3)
+        self.create_cells()
+
     def resize(self, size):
         if self.is_solving:
             return
         size = size if size >= 100 else 100
         size = size if size <= 200 else 200
+        scale = size / self.cell_size
         self.cell_size = size
-
-        for i, cell in enumerate(self.cells):
-            if cell != 0:
-                x = i % 4
-                y = i // 4
-                cell.resize(self.cell_size, x, y)
-            else:
-                self.freecell = [self._size(1, i % 4),
-                                 self._size(1, i // 4),
-                                 self._size(1, i % 4 + 1),
-                                 self._size(1, i % 4 + 1)]
+        # The board always spans four cell sizes, whatever its side.
+        self.tile_size = t = self.cell_size * 4 // self.side
+
+        for number, cell in self.cells.items():
+            i = self.board.where[number]
+            cell.resize(t, i % self.side, i // self.side)
+        self.canvas.scale('overlay', 0, 0, scale, scale)
+        for num, font in self.fonts.items():
+            font.configure(size=self._size(num))
+        self.tile_font.configure(size=t // 3)
         self.canvas['height'] = self._size(1, 4)
         self.canvas['width'] = self._size(1, 4)
-        if not self.is_play:
-            self.show_start_screen()
-        elif self.is_pause:
-            self.show_start_screen()
 
     def save_record(self):
-        record = {'moves': self.moves, 'time': self.str_time}
-        self.records.data['moves'].append(record)
-        self.records.data['time'].append(record)
-        self.records.save()
+        self.records.add(self.side, self.start_board, self.moves,
+                         self.game_time, self.str_time)
 
     def time_from_seconds(self, t):
         hours, seconds = divmod(t, 3600)
@@ -249,21 +472,25 @@ class Application(tk.Frame):
         self.canvas.event_generate('<ButtonPress-1>', x=x, y=y)
         self.canvas.event_generate('<ButtonRelease-1>', x=x, y=y)
 
-    def move_freecell(self, direction):
-        fci = self.cells.index(0)
-        args = {'left': [fci - 1, 'right'],
-                'right': [fci + 1, 'left'],
-                'up': [fci - 4, 'down'],
-                'down': [fci + 4, 'up']}
-
-        if 0 <= args[direction][0] <= 15:
-            current = self.cells[args[direction][0]]
-            self.moves += 1
-            current.move(args[direction][1])
-            self.cells[fci] = current
-            self.freecell = self.canvas.coords(current.cell_id)
-            self.cells[args[direction][0]] = 0
-            time.sleep(.3)
+    def cell_origin(self, i):
+        return (i % self.side * self.tile_size,
+                i // self.side * self.tile_size)
+
+    def speculate(self):
+        # Starts solving the board in play, at low priority, before anyone
+        # asks for it.
+        self.speculation = None
+        if self.is_play and not self.is_solving and not self.board.solved():
+            self.session.speculate(self.board, self.side,
+                                   self.heuristic.get())
+
+    def schedule_speculation(self):
+        # A move stops the speculation at once; a new one starts when the
+        # player has stopped moving for a second.
+        if self.speculation is not None:
+            self.after_cancel(self.speculation)
+        self.session.cancel()
+        self.speculation = self.after(1000, self.speculate)
 
     def solve(self):
         if self.is_solving:
@@ -272,54 +499,135 @@ class Application(tk.Frame):
             self.show_ask_screen()
 
     def do_solve(self):
-        solved_state = slide_solved_state(4)
-        neighbours = slide_neighbours(4)
-        is_goal = lambda p: p == solved_state
-        board = tuple([int(i.number) if i != 0 else 0 for i in self.cells])
-        slide_solver = IDAStar(slide_wd(4, solved_state), neighbours)
-        _, moves, *_ = slide_solver.solve(board, is_goal, 80)
-
-        self.s_moves = [{-1: "left", 1: "right", -4: "up", 4: "down"}
+        n = self.side
+        solved_state = slide_solved_state(n)
+        is_goal = partial(eq, solved_state)
+        board = tuple(self.board)
+        watch = {'cancel': self.s_cancel, 'progress': self.set_progress}
+        try:
+            if os.environ.get(SERVICE_ENV) and not self.s_quick:
+                try:
+                    self.s_moves = self.solve_remote(board)
+                    return
+                except OSError:
+                    # No service listening; solve here instead.
+                    pass
+            if not self.s_quick and not self.s_parallel:
+                s_moves = self.session.result(board, self.s_heuristic,
+                                              self.s_cancel)
+                if s_moves is not None:
+                    self.s_moves = s_moves
+                    return
+            if n > 4:
+                slide_solver = self.session.engine(n)
+                _, moves, *_ = slide_solver.solve(board, is_goal, **watch)
+            elif self.s_quick:
+                slide_solver = CachedSolver(AnytimeIDAStar(
+                    slide_engine(n, self.s_heuristic)), n,
+                    self.solution_cache, self.s_heuristic)
+                _, moves, *_ = slide_solver.solve(
+                    board, is_goal, 80, on_solution=self.set_best,
+                    time_limit=self.quick_time_limit, **watch)
+            elif self.s_parallel:
+                with ParallelIDAStar(slide_engine,
+                                     (n, self.s_heuristic)) as slide_solver:
+                    slide_solver = CachedSolver(slide_solver, n,
+                                                self.solution_cache,
+                                                self.s_heuristic)
+                    _, moves, *_ = slide_solver.solve(board, is_goal, 80,
+                                                      **watch)
+            else:
+                slide_solver = self.session.engine(n, self.s_heuristic)
+                _, moves, *_ = slide_solver.solve(board, is_goal, 80, **watch)
+        except SolveTimeout:
+            # Only the quick solve has a time limit, and it ran out before
+            # the first solution.
+            self.s_moves = None
+            self.s_error = (f'No solution found in\n'
+                            f'{self.quick_time_limit} seconds')
+            return
+        except SolveCancelled:
+            self.s_moves = None
+            return
+        if self.s_cancel.is_set() and not self.s_show_now:
+            self.s_moves = None
+            return
+
+        self.s_moves = [{-1: "left", 1: "right", -n: "up", n: "down"}
                         [move[1]] for move in moves]
 
-    def change_letters(self, text):
-        dots = ['.' * i for i in range(1, 20)]
-        i = 0
-        while True:
-            if self.is_solve:
-                break
-            s = dots[i % len(dots)]
-            self.canvas.itemconfig(text, text=s)
-            i += 1
-            time.sleep(.5)
+    def solve_remote(self, board):
+        # Solves on the solver service named by $GAME15_SOLVER, which keeps
+        # its tables loaded between games.
+        with SolverClient() as client:
+            return client.solve(board, heuristic=self.s_heuristic,
+                                cancel=self.s_cancel)['moves']
 
-    def callback(self, data):
+    def set_progress(self, info):
+        self.s_progress = info
+
+    def set_best(self, path, moves):
+        self.s_best = len(moves)
+
+    def show_best(self):
+        # The anytime solver returns its best solution when cancelled.
+        self.s_show_now = True
+        self.s_cancel.set()
+
+    def cancel_solve(self):
+        self.s_cancel.set()
+
+    def solved(self, data):
+        # Called on the solver thread; the main loop picks the result up in
+        # change_letters.
+        self.s_result = data
         self.is_solve = True
-        self.canvas.delete('all')
-        if data == 'successful':
-            button = tk.Button(text='Show solution',
-                               command=self.show_solution,
-                               justify=tk.CENTER,
-                               font=f"Consolas {self._size(6)}")
-            self.canvas.create_window(
-                self._size(1, 2),
-                self._size(1, 2),
-                window=button)
+
+    def change_letters(self, i=0):
+        if self.is_solve:
+            self.callback(self.s_result)
+            return
+        screen = self.screens['solve']
+        self.canvas.itemconfig(screen['dots'], text='.' * (i % 19 + 1))
+        info = self.s_progress
+        if info:
+            self.canvas.itemconfig(
+                screen['progress'], text=f"Bound {info['bound']}, "
+                                         f"{info['nodes']} positions\n"
+                                         f"{info['nodes_per_sec']:.0f} "
+                                         f"positions/s")
+        if self.s_best is not None:
+            self.canvas.itemconfig(screen['best'], text=f'Best so far: '
+                                                        f'{self.s_best} moves')
+            self.canvas.itemconfig(screen['show_best'], state='normal')
+        self.after(500, self.change_letters, i + 1)
+
+    def callback(self, data):
+        if data == 'successful' and self.s_error is not None:
+            self.is_solving = False
+            self.show_result_screen(self.s_error, ok=True)
+        elif data == 'successful' and self.s_moves is None:
+            self.unpause()
+            self.is_solving = False
+        elif data == 'successful' and self.s_show_now:
+            self.show_solution()
+        elif data == 'successful':
+            self.show_result_screen()
         else:
-            self.canvas.create_text(
-                self._size(1, 2),
-                self._size(1, 2),
-                text='Error while solving puzzle',
-                justify=tk.CENTER,
-                font=f"Consolas {self._size(6)}")
+            self.show_result_screen('Error while solving puzzle')
 
     def show_solution(self):
+        self.hints.learn(self.board, self.s_moves)
         self.unpause()
-        threading.Thread(target=self.do_moves, daemon=True).start()
+        self.playback = Playback(self, self.s_moves, done=self.end_playback)
+        self.playback.start()
+
+    def control_playback(self, action, event=None):
+        if self.playback is not None:
+            getattr(self.playback, action)()
 
-    def do_moves(self):
-        for move in self.s_moves:
-            self.move_freecell(move)
+    def end_playback(self):
+        self.playback = None
         if self.is_win():
             self.win()
 
@@ -327,43 +635,41 @@ class Application(tk.Frame):
     def click_on_cell(self, event):
         if self.is_solving:
             return
-        x = event.x // self.cell_size
-        y = event.y // self.cell_size
+        size = self.tile_size
+        side = self.side
+        x = event.x // size
+        y = event.y // size
 
-        current = self.cells[x + y * 4]
-        if current != 0:
+        direction = self.board.direction_to(x + y * side)
+        if direction is not None:
             self.moves += 1
-            coords = self.canvas.coords(current.cell_id)
-            fc = self.freecell
-
-            if coords[0] + self.cell_size == fc[0] and coords[1] == fc[1]:
-                current.move('right')
-                self.cells[x + 1 + y * 4] = current
-                self.freecell = coords
-                self.cells[x + y * 4] = 0
-
-            elif coords[0] - self.cell_size == fc[0] and coords[1] == fc[1]:
-                current.move('left')
-                self.cells[x - 1 + y * 4] = current
-                self.freecell = coords
-                self.cells[x + y * 4] = 0
-
-            elif coords[1] + self.cell_size == fc[1] and coords[0] == fc[0]:
-                current.move('down')
-                self.cells[x + y * 4 + 4] = current
-                self.freecell = coords
-                self.cells[x + y * 4] = 0
-
-            elif coords[1] - self.cell_size == fc[1] and coords[0] == fc[0]:
-                current.move('up')
-                self.cells[x + y * 4 - 4] = current
-                self.freecell = coords
-                self.cells[x + y * 4] = 0
-
+            tile = self.board.move(direction)
+            self.cells[tile].place(*self.cell_origin(self.board.where[tile]))
             if self.is_win():
                 self.win()
+            else:
+                self.schedule_speculation()
+
+    def show_hint(self, event=None):
+        # Outlines the tile to slide next for a moment.
+        if not self.is_play or self.is_pause or self.is_solving or \
+                self.playback is not None:
+            return
+        ready = self.session.ready()
+        if ready is not None:
+            self.hints.learn(*ready)
+        hint = self.hints.hint(self.board)
+        if hint is None:
+            return
+        cell = self.cells[self.board.tiles[self.board.source(hint[0])]]
+        self.canvas.itemconfigure(cell.cell_id, outline='red', width=4)
+        self.canvas.tag_raise(cell.cell_id)
+        self.canvas.tag_raise(cell.text_id)
+        self.after(700, self.canvas.itemconfigure, cell.cell_id,
+                   {'outline': 'black', 'width': 1})
 
     def win(self):
+        self.session.cancel()
         self.is_solving = False
         self.is_play = False
         self.finish_time = time.time()
@@ -389,159 +695,175 @@ class Application(tk.Frame):
                     self.game_time += current_time - self.start_time
                     self.start_time = None
                 self.start_time = time.time()
-                self.canvas.delete('all')
-                [cell.create() for cell in self.cells if cell != 0]
+                self.show_board()
             else:
                 self.show_start_screen()
 
     def is_win(self):
-        return ([i.number if i != 0 else 0 for i in self.cells] ==
-                self.numbers + [0])
+        return self.board.solved()
 
     # --------------------------Screens---------------------------------
+    def build_screens(self):
+        # Every screen is drawn once, hidden, with its items tagged
+        # 'overlay' and its name; showing one only flips item states.
+        # Items whose text depends on the game are kept by name.
+        text, button = self._text, self._button
+        self.screens['start'] = {
+            'play': button('start', 2, 2, 'Start play', self.create_cells)}
+        text('about', 2, 1.5, 'This is a simple puzzle\n "Game 15".')
+        button('about', 2, 2, 'OK', self.unpause, font=7)
+        self.screens['records'] = {
+            'title': text('records', 2, 1.8 / 7),
+            'lines': [text('records', 2, 1.3 / 2 + 1.8 / 7 * i, font=7)
+                      for i in range(10)],
+            'ok': button('records', 1.5, 3.5, 'OK', self.unpause),
+            'other': button('records', 3, 3.5, '', None)}
+        self.screens['win'] = {
+            'moves': text('win', 2, 1.5),
+            'time': text('win', 2, 2, font=7)}
+        text('win', 2, 1, 'You Win')
+        button('win', 2, 2.5, 'Play again', self.create_cells)
+        for i, line in enumerate(['Solve a puzzle?',
+                                  'This can take a long time',
+                                  '(from 10 seconds to',
+                                  '15 minutes or more).',
+                                  'Time depends on the power of',
+                                  'the computer and the complexity',
+                                  'of the layout']):
+            text('ask', 2, 1.3 / 2 + 1.8 / 7 * i, line, font=7)
+        button('ask', 1.5, 3, 'Yes', self.show_solve_screen)
+        button('ask', 2.5, 3, 'No', self.unpause)
+        text('solve', 2, 1.7, 'Solving the puzzle')
+        self.screens['solve'] = {
+            'dots': text('solve', 2, 2),
+            'progress': text('solve', 2, 2.5, font=10),
+            'best': text('solve', 2, 1.5 / 2, font=10),
+            'show_best': button('solve', 2, 1.1, 'Show best solution',
+                                self.show_best, font=7)}
+        button('solve', 2, 3.2, 'Cancel', self.cancel_solve, font=7)
+        self.screens['result'] = {
+            'show': button('result', 2, 2, 'Show solution',
+                           self.show_solution),
+            'error': text('result', 2, 2),
+            'ok': button('result', 2, 3, 'OK', self.unpause, font=7)}
+
+    def _text(self, screen, x, y, text='', font=6):
+        # x and y are in cell sizes, as with _size().
+        return self.canvas.create_text(
+            x * self.cell_size, y * self.cell_size, text=text,
+            justify=tk.CENTER, font=self.fonts[font],
+            tags=('overlay', screen), state='hidden')
+
+    def _button(self, screen, x, y, text, command, font=6):
+        button = tk.Button(text=text, command=command, justify=tk.CENTER,
+                           font=self.fonts[font])
+        item = self.canvas.create_window(
+            x * self.cell_size, y * self.cell_size, window=button,
+            tags=('overlay', screen), state='hidden')
+        self.buttons[item] = button
+        return item
+
+    def show_screen(self, name):
+        self.canvas.itemconfigure('overlay', state='hidden')
+        self.canvas.itemconfigure('tile', state='hidden')
+        self.canvas.itemconfigure(name, state='normal')
+
+    def show_board(self):
+        self.canvas.itemconfigure('overlay', state='hidden')
+        self.canvas.itemconfigure('tile', state='normal')
+
     def show_about(self):
         if self.is_solving:
             return
         self.pause()
-        self.canvas.delete('all')
-        button = tk.Button(text='OK', command=self.unpause,
-                           justify=tk.CENTER,
-                           font=f"Consolas {self._size(7)}")
-        self.canvas.create_text(
-            self._size(1, 2),
-            self._size(1, 1.5),
-            text='This is a simple puzzle\n "Game 15".',
-            justify=tk.CENTER,
-            font=f"Consolas {self._size(6)}")
-        self.canvas.create_window(
-            self._size(1, 2),
-            self._size(1, 2),
-            window=button)
+        self.show_screen('about')
 
     def show_records(self, param='time'):
         if self.is_solving:
             return
         self.pause()
-        self.canvas.delete('all')
+        screen = self.screens['records']
         param2 = 'moves' if param == 'time' else 'time'
-        text = ''
-        self.canvas.create_text(
-            self._size(1, 2), self._size(7, 1.8), text=f'Top 10 (by {param}):',
-            justify=tk.CENTER, font=f"Consolas {self._size(6)}")
-        if self.records.data[param]:
-            for i, r in enumerate(self.records.data[param]):
+        self.canvas.itemconfig(
+            screen['title'],
+            text=f'Top 10, {self.side}x{self.side} (by {param}):')
+        rows = self.records.top(param, self.side)
+        for i, item in enumerate(screen['lines']):
+            text = ''
+            if i < len(rows):
+                r = rows[i]
                 if param == 'time':
                     text = f'{i + 1}. Time: {r["time"]} Moves: {r["moves"]}'
                 else:
                     text = f'{i + 1}. Moves: {r["moves"]} Time: {r["time"]}'
-
-                self.canvas.create_text(
-                    self._size(1, 2),
-                    self._size(2, 1.3) + self._size(7, 1.8) * i,
-                    text=text, justify=tk.CENTER,
-                    font=f"Consolas {self._size(7)}")
-
-        button = tk.Button(text='OK', command=self.unpause,
-                           justify=tk.CENTER,
-                           font=f"Consolas {self._size(6)}")
-        button2 = tk.Button(text=f'by {param2}',
-                            command=lambda: self.show_records(param2),
-                            justify=tk.CENTER,
-                            font=f"Consolas {self._size(6)}")
-        self.canvas.create_window(
-            self._size(1, 1.5), self._size(1, 3.5), window=button)
-        self.canvas.create_window(
-            self._size(1, 3), self._size(1, 3.5), window=button2)
+            self.canvas.itemconfig(item, text=text)
+        self.buttons[screen['other']].configure(
+            text=f'by {param2}', command=lambda: self.show_records(param2))
+        self.show_screen('records')
 
     def show_win_screen(self):
         self.is_solving = False
-        self.canvas.delete('all')
-        button = tk.Button(text='Play again',
-                           command=self.create_cells,
-                           justify=tk.CENTER, font=f"Consolas {self._size(6)}")
-        self.canvas.create_text(self._size(1, 2),
-                                self._size(1),
-                                text='You Win', justify=tk.CENTER,
-                                font=f"Consolas {self._size(6)}")
-        self.canvas.create_text(self._size(1, 2),
-                                self._size(1, 1.5),
-                                text=f'Moves: {self.moves}',
-                                justify=tk.CENTER,
-                                font=f"Consolas {self._size(6)}")
-        self.canvas.create_text(self._size(1, 2),
-                                self._size(1, 2),
-                                text=f'Time: {self.str_time}',
-                                justify=tk.CENTER,
-                                font=f"Consolas {self._size(7)}")
-        self.canvas.create_window(self._size(1, 2),
-                                  self._size(1, 2.5),
-                                  window=button)
+        screen = self.screens['win']
+        self.canvas.itemconfig(screen['moves'], text=f'Moves: {self.moves}')
+        self.canvas.itemconfig(screen['time'], text=f'Time: {self.str_time}')
+        self.show_screen('win')
 
     def show_start_screen(self):
-        self.canvas.delete('all')
         if self.is_play:
             text = 'Continue play'
             fn = self.unpause
         else:
             text = 'Start play'
             fn = self.create_cells
-        button = tk.Button(text=text, command=fn, justify=tk.CENTER,
-                           font=f"Consolas {self._size(6)}")
-        self.canvas.create_window(self._size(1, 2), self._size(1, 2),
-                                  window=button)
+        self.buttons[self.screens['start']['play']].configure(text=text,
+                                                              command=fn)
+        self.show_screen('start')
+
+    def show_result_screen(self, error=None, ok=False):
+        screen = self.screens['result']
+        self.show_screen('result')
+        if error is None:
+            self.canvas.itemconfig(screen['error'], state='hidden')
+        else:
+            self.canvas.itemconfig(screen['show'], state='hidden')
+            self.canvas.itemconfig(screen['error'], text=error)
+        if not ok:
+            self.canvas.itemconfig(screen['ok'], state='hidden')
 
     def show_ask_screen(self):
         self.pause()
-        self.canvas.delete('all')
-        button = tk.Button(text='Yes', command=self.show_solve_screen,
-                           justify=tk.CENTER,
-                           font=f"Consolas {self._size(6)}")
-        button2 = tk.Button(text='No', command=self.unpause,
-                            justify=tk.CENTER,
-                            font=f"Consolas {self._size(6)}")
-        text = ['Solve a puzzle?', 'This can take a long time',
-                '(from 10 seconds to', '15 minutes or more).',
-                'Time depends on the power of',
-                'the computer and the complexity',
-                'of the layout']
-        for i, s in enumerate(text):
-            self.canvas.create_text(
-                self._size(1, 2),
-                self._size(2, 1.3) + self._size(7, 1.8) * i,
-                text=s, justify=tk.CENTER,
-                font=f"Consolas {self._size(7)}")
-
-        self.canvas.create_window(
-            self._size(1, 1.5),
-            self._size(1, 3),
-            window=button)
-        self.canvas.create_window(
-            self._size(1, 2.5),
-            self._size(1, 3),
-            window=button2)
+        self.show_screen('ask')
 
     def show_solve_screen(self):
+        # A speculation still waiting to start would only compete with
+        # this solve; one already running is picked up by do_solve.
+        if self.speculation is not None:
+            self.after_cancel(self.speculation)
+            self.speculation = None
         self.is_solving = True
+        self.is_solve = False
+        self.s_heuristic = self.heuristic.get()
+        self.s_parallel = self.parallel.get()
+        self.s_quick = self.quick.get()
+        self.s_cancel = threading.Event()
+        self.s_progress = None
+        self.s_best = None
+        self.s_show_now = False
+        self.s_error = None
         self.start_time = time.time()
-        self.canvas.delete('all')
-        self.canvas.create_text(
-            self._size(1, 2),
-            self._size(1, 1.7),
-            text='Solving the puzzle', justify=tk.CENTER,
-            font=f"Consolas {self._size(6)}")
-        text = self.canvas.create_text(
-            self._size(1, 2),
-            self._size(1, 2),
-            text='', justify=tk.CENTER,
-            font=f"Consolas {self._size(6)}")
-        threading.Thread(target=self.change_letters, args=[text],
-                         daemon=True).start()
-        SaveThread(self.callback, target=self.do_solve, daemon=True).start()
+        screen = self.screens['solve']
+        for item in ('dots', 'progress', 'best'):
+            self.canvas.itemconfig(screen[item], text='')
+        self.show_screen('solve')
+        self.canvas.itemconfig(screen['show_best'], state='hidden')
+        SaveThread(self.solved, target=self.do_solve, daemon=True).start()
+        self.after(500, self.change_letters)
 
 
 if __name__ == '__main__':
     root = tk.Tk()
     root.title('Game 15')
     root.resizable(False, False)
-    Application(root)
+    app = Application(root)
     root.mainloop()
+    app.session.close()
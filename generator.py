@@ -0,0 +1,128 @@
+import argparse
+import random
+import sys
+from functools import partial
+from operator import eq
+from parallel import slide_engine
+from solver import (slide_is_solvable, slide_neighbours, slide_solved_state,
+                    slide_wd)
+
+
+def random_board(n, rng=random):
+    p = list(range(n * n))
+    rng.shuffle(p)
+    if not slide_is_solvable(p):
+        # Swapping two tiles flips the permutation's parity and leaves the
+        # blank where it is.
+        i, j = [k for k in range(3) if p[k]][:2]
+        p[i], p[j] = p[j], p[i]
+    return tuple(p)
+
+
+def manhattan(n):
+    def h(p):
+        d = 0
+        for i, c in enumerate(p):
+            if c:
+                d += abs(i % n - (c - 1) % n) + abs(i // n - (c - 1) // n)
+        return d
+    return h
+
+
+def slide_heuristic(n):
+    # Walking distance where its table is cheap to build, else Manhattan.
+    if n <= 4:
+        return slide_wd(n, slide_solved_state(n))
+    return manhattan(n)
+
+
+class Generator:
+    # Boards whose heuristic or optimal distance lies in [min_moves,
+    # max_moves].  Without an upper limit boards are drawn uniformly;
+    # with one they come from random walks off the solved state, stopped
+    # as soon as the heuristic reaches min_moves.  Optimal distances need
+    # a full solve per candidate and are only offered up to 4x4.
+    def __init__(self, n, min_moves=0, max_moves=None, measure='heuristic',
+                 heuristic='wd', rng=random, max_walk=1000):
+        if measure not in ('heuristic', 'optimal'):
+            raise ValueError(f'unknown measure {measure!r}')
+        if measure == 'optimal' and n > 4:
+            raise ValueError('optimal distances are only offered up to 4x4')
+        self.n = n
+        self.min_moves = min_moves
+        self.max_moves = max_moves
+        self.rng = rng
+        self.max_walk = max_walk
+        self.h = slide_heuristic(n)
+        self.neighbours = slide_neighbours(n)
+        self.goal = slide_solved_state(n)
+        self.engine = slide_engine(n, heuristic) \
+            if measure == 'optimal' else None
+
+    def distance(self, p):
+        if self.engine is None:
+            return self.h(p)
+        _, moves, *_ = self.engine.solve(p, partial(eq, self.goal))
+        return len(moves)
+
+    def _walk(self):
+        rng, h = self.rng, self.h
+        p = self.goal
+        last = 0
+        for _ in range(self.max_walk):
+            p, last = rng.choice([(c, m) for _, c, (_, m) in
+                                  self.neighbours(p) if m != -last])
+            if h(p) >= self.min_moves:
+                return p
+        return None
+
+    def __call__(self):
+        lo, hi = self.min_moves, self.max_moves
+        while True:
+            if hi is None:
+                p = random_board(self.n, self.rng)
+            else:
+                p = self._walk()
+                if p is None or self.h(p) > hi:
+                    continue
+            d = self.distance(p)
+            if d >= lo and (hi is None or d <= hi):
+                return p
+
+    def __iter__(self):
+        while True:
+            yield self()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Generate solvable boards, one per line, in the format '
+                    'solve_batch.py reads.')
+    parser.add_argument('-n', '--size', type=int, default=4)
+    parser.add_argument('-c', '--count', type=int, default=1)
+    parser.add_argument('--min', type=int, default=0, dest='min_moves')
+    parser.add_argument('--max', type=int, default=None, dest='max_moves')
+    parser.add_argument('--measure', choices=['heuristic', 'optimal'],
+                        default='heuristic')
+    parser.add_argument('--heuristic', choices=['wd', 'pdb'], default='wd',
+                        help='solver heuristic for --measure optimal')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('-o', '--output', default='-',
+                        help='file for boards, "-" for stdout')
+    args = parser.parse_args()
+
+    try:
+        generator = Generator(args.size, args.min_moves, args.max_moves,
+                              args.measure, args.heuristic,
+                              random.Random(args.seed))
+    except ValueError as e:
+        parser.error(str(e))
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    with out:
+        for _, p in zip(range(args.count), generator):
+            out.write(' '.join(map(str, p)) + '\n')
+            out.flush()
+
+
+if __name__ == '__main__':
+    main()
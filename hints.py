@@ -0,0 +1,115 @@
+import time
+from generator import slide_heuristic
+from solver import slide_neighbours, slide_solved_state
+
+
+class HintEngine:
+    # Next moves towards the goal from a solution already found.  Every
+    # board on a learned path maps to its next move and the moves left, so
+    # a player who follows the path gets hints by a dict lookup.  Off the
+    # path, a short search looks for the cheapest way back onto it (moves
+    # there plus moves left from there) and remembers the detour; only if
+    # that finds nothing in its budget is the move that lowers h most
+    # offered, with no distance.  Moves are named after the way the blank
+    # goes, as in Board.
+    def __init__(self, n, cache=None, radius=10, time_limit=0.05):
+        self.n = n
+        self.cache = cache
+        self.radius = radius
+        self.time_limit = time_limit
+        self.h = slide_heuristic(n)
+        self.neighbours = slide_neighbours(n)
+        self.goal = slide_solved_state(n)
+        self.names = {-1: 'left', 1: 'right', -n: 'up', n: 'down'}
+        self.steps = {name: m for m, name in self.names.items()}
+        self.next = {}
+
+    def clear(self):
+        self.next = {}
+
+    def learn(self, board, moves):
+        # Remembers the path that `moves` (names) take from `board`.  A
+        # board already known with fewer moves left keeps its hint.
+        p = list(board)
+        gap = p.index(0)
+        left = len(moves)
+        for name in moves:
+            key = tuple(p)
+            known = self.next.get(key)
+            if known is None or known[1] > left:
+                self.next[key] = (name, left)
+            m = self.steps[name]
+            p[gap], p[gap + m] = p[gap + m], 0
+            gap += m
+            left -= 1
+
+    def hint(self, board):
+        # (move, moves left) for the board, with None for moves left when
+        # the move is only a guess; None when the board is solved.
+        board = tuple(board)
+        if board == self.goal:
+            return None
+        known = self.next.get(board)
+        if known is not None:
+            return known
+        if self.cache is not None:
+            moves = self.cache.get(board, self.n)
+            if moves is not None:
+                self.learn(board, [self.names[m] for m in moves])
+                return self.next[board]
+        detour = self._repair(board)
+        if detour is not None:
+            self.learn(board, detour)
+            return self.next[board]
+        _, m = min((self.h(c), m) for _, c, (_, m) in self.neighbours(board))
+        return self.names[m], None
+
+    def _repair(self, board):
+        # Depth-first search up to `radius` moves for the board on a known
+        # path with the fewest moves in total, pruned by h against the best
+        # total so far.  Returns the whole route as move names.
+        if not self.next:
+            return None
+        deadline = time.monotonic() + self.time_limit
+        h, neighbours, known = self.h, self.neighbours, self.next
+        best = [None, None]
+        path = []
+        nodes = [0]
+
+        def search(p, g, last):
+            nodes[0] += 1
+            if nodes[0] % 64 == 0 and time.monotonic() > deadline:
+                raise TimeoutError
+            for _, c, (_, m) in neighbours(p):
+                if m == -last:
+                    continue
+                hit = known.get(c)
+                path.append(m)
+                if hit is not None and (best[0] is None or
+                                        g + 1 + hit[1] < best[0]):
+                    best[0], best[1] = g + 1 + hit[1], list(path)
+                if g + 1 < self.radius and \
+                        (best[0] is None or g + 1 + h(c) < best[0]):
+                    search(c, g + 1, m)
+                path.pop()
+
+        try:
+            search(board, 0, 0)
+        except TimeoutError:
+            pass
+        if best[1] is None:
+            return None
+        # Finish the route along the learned path from where it joins.
+        p = list(board)
+        gap = p.index(0)
+        for m in best[1]:
+            p[gap], p[gap + m] = p[gap + m], 0
+            gap += m
+        route = [self.names[m] for m in best[1]]
+        while tuple(p) != self.goal:
+            name = known[tuple(p)][0]
+            m = self.steps[name]
+            p[gap], p[gap + m] = p[gap + m], 0
+            gap += m
+            route.append(name)
+        return route
@@ -0,0 +1,200 @@
+import csv
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from time import perf_counter
+
+
+def effective_branching_factor(nodes, depth):
+    # The b for which a uniform tree of this depth, 1 + b + ... + b^depth,
+    # has as many nodes as were searched.
+    if depth < 1 or nodes <= depth + 1:
+        return 1.0
+    lo, hi = 1.0, float(nodes)
+    for _ in range(50):
+        b = (lo + hi) / 2
+        total = term = 1.0
+        for _ in range(int(depth)):
+            term *= b
+            total += term
+            if total > nodes:
+                break
+        if total > nodes:
+            hi = b
+        else:
+            lo = b
+    return lo
+
+
+class TimedHeuristic:
+    # Stands in for h during an instrumented solve and adds the time spent
+    # in it to stats.h_time.
+    def __init__(self, h, stats):
+        self.h = h
+        self.stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self.h, name)
+
+    def __call__(self, p):
+        start = perf_counter()
+        r = self.h(p)
+        self.stats.h_time += perf_counter() - start
+        return r
+
+    def key(self, p):
+        start = perf_counter()
+        r = self.h.key(p)
+        self.stats.h_time += perf_counter() - start
+        return r
+
+    def value(self, key):
+        start = perf_counter()
+        r = self.h.value(key)
+        self.stats.h_time += perf_counter() - start
+        return r
+
+    def update(self, key, p, descr):
+        start = perf_counter()
+        r = self.h.update(key, p, descr)
+        self.stats.h_time += perf_counter() - start
+        return r
+
+
+def timed_neighbours(neighbours, stats):
+    def timed(node):
+        start = perf_counter()
+        r = list(neighbours(node))
+        stats.neighbour_time += perf_counter() - start
+        return r
+    return timed
+
+
+class SamplingProfiler:
+    # Samples the stack of the thread that starts it every `interval`
+    # seconds and counts the innermost frames by file and function.
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.samples = Counter()
+        self.thread = None
+
+    def start(self):
+        self.target = threading.get_ident()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            if frame is not None:
+                code = frame.f_code
+                self.samples[f'{os.path.basename(code.co_filename)}:'
+                             f'{code.co_name}'] += 1
+
+    def top(self, limit=20):
+        return self.samples.most_common(limit)
+
+
+class SolveStats:
+    # Statistics of one solve run through SolveStats.solve(engine, ...).
+    # Each IDA* iteration records its bound, nodes, time, effective
+    # branching factor and the time spent in h and in neighbour generation.
+    # h and neighbours are wrapped only for the duration of the solve; the
+    # timers themselves add to the totals.  The profiler may be anything
+    # with start(), stop() and top(), such as SamplingProfiler.
+    fields = ['bound', 'nodes', 'time', 'h_time', 'neighbour_time', 'ebf']
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.iterations = []
+        self.h_time = 0
+        self.neighbour_time = 0
+        self.root_h = None
+        self.solution_length = None
+        self.nodes = 0
+        self.time = 0
+        self._current = None
+
+    def solve(self, engine, root, is_goal, max_cost=None, **kwargs):
+        h = getattr(engine, 'h', None)
+        neighbours = getattr(engine, 'neighbours', None)
+        if h is not None:
+            # Packed engines search (and take h of) packed boards.
+            pack = getattr(engine, 'pack', None)
+            self.root_h = h(root if pack is None else pack(root))
+            engine.h = TimedHeuristic(h, self)
+        if neighbours is not None:
+            engine.neighbours = timed_neighbours(neighbours, self)
+        engine.stats = self
+        if self.profiler is not None:
+            self.profiler.start()
+        start = perf_counter()
+        try:
+            r = engine.solve(root, is_goal, max_cost, **kwargs)
+        finally:
+            self.time = perf_counter() - start
+            if self.profiler is not None:
+                self.profiler.stop()
+            self._close(engine)
+            self.nodes = engine.nodes_evaluated
+            if h is not None:
+                engine.h = h
+            if neighbours is not None:
+                engine.neighbours = neighbours
+            del engine.stats
+        if r is not None:
+            self.solution_length = len(r[1])
+        return r
+
+    def iteration(self, engine, bound):
+        self._close(engine)
+        self._current = (bound, perf_counter(), engine.nodes_evaluated,
+                         self.h_time, self.neighbour_time)
+
+    def _close(self, engine):
+        if self._current is None:
+            return
+        bound, start, nodes, h_time, neighbour_time = self._current
+        self._current = None
+        nodes = engine.nodes_evaluated - nodes
+        self.iterations.append({
+            'bound': bound,
+            'nodes': nodes,
+            'time': perf_counter() - start,
+            'h_time': self.h_time - h_time,
+            'neighbour_time': self.neighbour_time - neighbour_time,
+            'ebf': effective_branching_factor(nodes, bound),
+        })
+
+    def to_dict(self):
+        d = {
+            'root_h': self.root_h,
+            'solution_length': self.solution_length,
+            # How much of the optimal distance h sees from the root.
+            'h_accuracy': self.root_h / self.solution_length
+            if self.root_h is not None and self.solution_length else None,
+            'nodes': self.nodes,
+            'time': self.time,
+            'h_time': self.h_time,
+            'neighbour_time': self.neighbour_time,
+            'iterations': self.iterations,
+        }
+        if self.profiler is not None:
+            d['profile'] = self.profiler.top()
+        return d
+
+    def to_json(self, indent=1):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def write_csv(self, f):
+        writer = csv.DictWriter(f, ['iteration'] + self.fields)
+        writer.writeheader()
+        for i, it in enumerate(self.iterations):
+            writer.writerow(dict(it, iteration=i))
@@ -0,0 +1,182 @@
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from solver import (IDAStar, IncrementalIDAStar, SlideWD, SolveCancelled,
+                    SolveMonitor, slide_solved_state, slide_neighbours,
+                    slide_wd)
+
+
+def slide_engine(n, heuristic='wd'):
+    goal = slide_solved_state(n)
+    if heuristic == 'pdb':
+        from pattern_db import slide_pdb
+        return IDAStar(slide_pdb(n, goal), slide_neighbours(n))
+    return IncrementalIDAStar(slide_wd(n, goal), slide_neighbours(n))
+
+
+_engine = None
+_stop = None
+
+
+def _init_worker(factory, args, stop):
+    global _engine, _stop
+    _engine = factory(*args)
+    _stop = stop
+
+
+def _search_subproblem(path, path_descrs, g, bound, is_goal):
+    if _stop.is_set():
+        return None, None, 0
+    # The shared event also stops subtrees that are already running.
+    _engine._watch(cancel=_stop)
+    _engine._reset(list(path), list(path_descrs), is_goal)
+    try:
+        t = _engine._search(g, bound)
+    except SolveCancelled:
+        return None, None, _engine.nodes_evaluated
+    if t is _engine.FOUND:
+        _stop.set()
+        return None, (_engine.path, _engine.path_descrs), \
+            _engine.nodes_evaluated
+    return t, None, _engine.nodes_evaluated
+
+
+class ParallelIDAStar(SolveMonitor):
+    # Splits the tree at a fixed depth and searches the subtrees of each
+    # bound on a process pool.  Workers build their own engine with
+    # factory(*args), so factory and is_goal must be picklable (a module
+    # level function, functools.partial(operator.eq, goal)).
+    def __init__(self, factory, args=(), workers=None, depth=8):
+        self.factory = factory
+        self.args = args
+        self.workers = workers or os.cpu_count()
+        self.depth = depth
+        self.engine = factory(*args)
+        self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def _start(self):
+        if self.pool is None:
+            # The game starts this from a process running threads (Tk's
+            # and the warm-ups), which must not be forked; see session.py.
+            ctx = multiprocessing.get_context('spawn')
+            self.stop = ctx.Event()
+            self.pool = ProcessPoolExecutor(
+                self.workers, mp_context=ctx, initializer=_init_worker,
+                initargs=(self.factory, self.args, self.stop))
+
+    def _frontier(self, root, is_goal):
+        frontier = []
+        path = [root]
+        path_descrs = []
+
+        def expand(g):
+            node = path[-1]
+            if is_goal(node):
+                return True
+            if g == self.depth:
+                frontier.append((tuple(path), tuple(path_descrs), g))
+                return False
+            for cost, n, descr in self.engine.neighbours(node):
+                if n in path:
+                    continue
+                path.append(n)
+                path_descrs.append(descr)
+                if expand(g + cost):
+                    return True
+                path.pop()
+                path_descrs.pop()
+            return False
+
+        if expand(0):
+            return None
+        scores = self._score([path[-1] for path, _, _ in frontier])
+        return [f + (h,) for f, h in zip(frontier, scores)]
+
+    def _score(self, nodes):
+        # The whole frontier is scored at once when numpy is available.
+        h = self.engine.h
+        if type(h) is SlideWD and nodes:
+            try:
+                from batch_heuristics import BatchHeuristics
+            except ImportError:
+                pass
+            else:
+                return BatchHeuristics(h.n, h.goal)(nodes).tolist()
+        return [h(p) for p in nodes]
+
+    def solve(self, root, is_goal, max_cost=None, **watch):
+        self.nodes_evaluated = 0
+        frontier = self._frontier(root, is_goal)
+        if frontier is None:
+            # The solution is shallower than the split depth.
+            r = self.engine.solve(root, is_goal, max_cost, **watch)
+            self.nodes_evaluated = self.engine.nodes_evaluated
+            return r
+        self._watch(**watch)
+        self.nodes_evaluated = len(frontier)
+
+        self._start()
+        self.stop.clear()
+        try:
+            return self._solve(frontier, root, is_goal, max_cost)
+        finally:
+            self.stop.clear()
+
+    def _solve(self, frontier, root, is_goal, max_cost):
+        bound = self.engine.h(root)
+        while max_cost is None or bound <= max_cost:
+            self._iteration(bound)
+            m = None
+            futures = []
+            for path, path_descrs, g, h in frontier:
+                if g + h > bound:
+                    if m is None or g + h < m:
+                        m = g + h
+                    continue
+                futures.append(self.pool.submit(
+                    _search_subproblem, path, path_descrs, g, bound,
+                    is_goal))
+
+            found = None
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=0.2,
+                                     return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.cancelled():
+                        continue
+                    t, r, nodes = future.result()
+                    self.nodes_evaluated += nodes
+                    if r is not None and found is None:
+                        # Every earlier bound was exhausted, so any
+                        # solution within this one is optimal.
+                        found = r
+                        for f in pending:
+                            f.cancel()
+                    if t is not None and (m is None or t < m):
+                        m = t
+                try:
+                    self._check()
+                except SolveCancelled:
+                    self.stop.set()
+                    for f in pending:
+                        f.cancel()
+                    wait(pending)
+                    raise
+            if found is not None:
+                return found[0], found[1], bound, self.nodes_evaluated
+            if m is None:
+                return None
+            bound = m
+        return None
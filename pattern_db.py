@@ -0,0 +1,148 @@
+import mmap
+import os
+from array import array
+from math import perm
+from solver import cache_path, slide_solved_state, write_cache_file
+
+
+# Disjoint tile groups per board size; the value of a partition is the sum
+# of its groups' distances, since each group only counts its own moves.
+PARTITIONS = {
+    3: {'8': [(1, 2, 3, 4, 5, 6, 7, 8)],
+        '44': [(1, 2, 4, 5), (3, 6, 7, 8)]},
+    4: {'555': [(1, 2, 3, 5, 6), (4, 7, 8, 11, 12), (9, 10, 13, 14, 15)],
+        '663': [(1, 2, 5, 6, 9, 13), (3, 4, 7, 8, 11, 12), (10, 14, 15)]},
+}
+DEFAULT_PARTITION = {3: '8', 4: '555'}
+
+
+def _rank(pos, cells):
+    r = 0
+    for i, p in enumerate(pos):
+        d = p
+        for q in pos[:i]:
+            if q < p:
+                d -= 1
+        r = r * (cells - i) + d
+    return r
+
+
+def _unrank(r, k, cells):
+    digits = []
+    for i in reversed(range(k)):
+        r, d = divmod(r, cells - i)
+        digits.append(d)
+    pos = []
+    for d in reversed(digits):
+        for q in sorted(pos):
+            if q <= d:
+                d += 1
+        pos.append(d)
+    return pos
+
+
+def gen_pattern_table(n, tiles):
+    cells = n * n
+    k = len(tiles)
+    goal = slide_solved_state(n)
+    movelist = []
+    for gap in range(cells):
+        x, y = gap % n, gap // n
+        movelist.append([m for m, ok in ((-1, x > 0), (1, x < n - 1),
+                                         (-n, y > 0), (n, y < n - 1)) if ok])
+
+    # 0-1 BFS over (pattern positions, blank): sliding a tile that is not
+    # in the pattern is free, so each layer is closed under free moves
+    # before the next one starts.
+    dist = bytearray(b'\xff') * (perm(cells, k) * cells)
+    start = _rank([goal.index(t) for t in tiles], cells) * cells + \
+        goal.index(0)
+    dist[start] = 0
+    layer = array('I', [start])
+    cost = 0
+    while layer:
+        next_layer = array('I')
+        i = 0
+        while i < len(layer):
+            s = layer[i]
+            i += 1
+            if dist[s] != cost:
+                continue
+            r, gap = divmod(s, cells)
+            pos = _unrank(r, k, cells)
+            for m in movelist[gap]:
+                q = gap + m
+                if q in pos:
+                    npos = pos[:]
+                    npos[pos.index(q)] = gap
+                    t = _rank(npos, cells) * cells + q
+                    if dist[t] > cost + 1:
+                        dist[t] = cost + 1
+                        next_layer.append(t)
+                else:
+                    t = r * cells + q
+                    if dist[t] > cost:
+                        dist[t] = cost
+                        layer.append(t)
+        layer = next_layer
+        cost += 1
+
+    return bytes(min(dist[r:r + cells])
+                 for r in range(0, len(dist), cells))
+
+
+def load_pattern_tables(n, partition):
+    groups = PARTITIONS[n][partition]
+    path = cache_path(f'pdb-{n}-{partition}.bin')
+    if not os.path.exists(path):
+        def write(f):
+            for tiles in groups:
+                f.write(gen_pattern_table(n, tiles))
+        write_cache_file(path, write)
+
+    with open(path, 'rb') as f:
+        data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    tables = []
+    offset = 0
+    for tiles in groups:
+        size = perm(n * n, len(tiles))
+        tables.append(data[offset:offset + size])
+        offset += size
+    return tables
+
+
+class PatternDB:
+    def __init__(self, n, partition=None):
+        self.n = n
+        self.cells = n * n
+        if n not in PARTITIONS:
+            raise ValueError(f'no pattern databases for {n}x{n} boards')
+        self.partition = partition or DEFAULT_PARTITION[n]
+        if self.partition not in PARTITIONS[n]:
+            raise ValueError(f'unknown partition {self.partition!r}')
+        self.groups = PARTITIONS[n][self.partition]
+        self.tables = load_pattern_tables(n, self.partition)
+
+        # Reflection in the main diagonal maps the goal onto itself, so the
+        # same tables also bound the mirrored board.
+        goal = slide_solved_state(n)
+        self.mirror_cell = [(i % n) * n + i // n for i in range(self.cells)]
+        self.mirror_tile = [goal[self.mirror_cell[goal.index(c)]]
+                            for c in range(self.cells)]
+
+    def __call__(self, p):
+        cells, mc, mt = self.cells, self.mirror_cell, self.mirror_tile
+        pos = [0] * cells
+        for i, c in enumerate(p):
+            pos[c] = i
+        h = 0
+        hm = 0
+        for tiles, table in zip(self.groups, self.tables):
+            h += table[_rank([pos[t] for t in tiles], cells)]
+            hm += table[_rank([mc[pos[mt[t]]] for t in tiles], cells)]
+        return h if h > hm else hm
+
+
+def slide_pdb(n, goal, partition=None):
+    assert goal == slide_solved_state(n)
+    return PatternDB(n, partition)
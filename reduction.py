@@ -0,0 +1,182 @@
+import heapq
+from collections import deque
+from functools import partial
+from operator import eq
+from solver import (IncrementalIDAStar, SolveMonitor, slide_neighbours,
+                    slide_solved_state, slide_wd)
+
+
+class ReductionSolver(SolveMonitor):
+    # Fast, non-optimal solver for large boards: the top row and left
+    # column of the unsolved part are placed tile by tile and locked until
+    # a final x final corner is left, which is solved optimally.  Only
+    # the usual solved state is supported as the goal.
+    optimal = False
+
+    def __init__(self, n, final=3):
+        self.n = n
+        self.final = final
+        self.movelist = []
+        for gap in range(n * n):
+            x, y = gap % n, gap // n
+            moves = []
+            if x > 0:
+                moves.append(-1)
+            if x < n - 1:
+                moves.append(+1)
+            if y > 0:
+                moves.append(-n)
+            if y < n - 1:
+                moves.append(+n)
+            self.movelist.append(moves)
+        goal = slide_solved_state(final)
+        self.corner = IncrementalIDAStar(slide_wd(final, goal),
+                                         slide_neighbours(final))
+
+    def solve(self, root, is_goal=None, max_cost=None, **watch):
+        self._watch(**watch)
+        self.nodes_evaluated = 0
+        n = self.n
+        self.board = list(root)
+        self.gap = self.board.index(0)
+        self.locked = [False] * (n * n)
+        self.path = [tuple(root)]
+        self.path_descrs = []
+
+        top = 0
+        while n - top > self.final:
+            self._solve_row(top, top)
+            self._solve_column(top, top + 1)
+            top += 1
+        self._solve_corner(top)
+        return self.path, self.path_descrs, len(self.path_descrs), \
+            self.nodes_evaluated
+
+    def _apply(self, m):
+        board, gap = self.board, self.gap
+        c = board[gap + m]
+        board[gap] = c
+        board[gap + m] = 0
+        self.gap = gap + m
+        self.path.append(tuple(board))
+        self.path_descrs.append((c, m))
+
+    def _move_tiles(self, tiles, targets):
+        # Best-first search over (tile cells..., blank cell) with the locked
+        # cells as walls.  A tile step usually costs about five blank moves,
+        # which the estimate reflects; the result need not be optimal.
+        n, movelist, locked = self.n, self.movelist, self.locked
+        board = self.board
+        start = tuple(board.index(t) for t in tiles) + (self.gap,)
+        goal = tuple(targets)
+        if start[:-1] == goal:
+            return
+
+        def estimate(state):
+            e = 0
+            b = state[-1]
+            near = None
+            for t, target in zip(state, goal):
+                d = abs(t % n - target % n) + abs(t // n - target // n)
+                if d:
+                    e += 5 * d
+                    if near is None:
+                        near = abs(t % n - b % n) + abs(t // n - b // n)
+            return e + (near or 0)
+
+        parents = {start: None}
+        queue = [(estimate(start), 0, start)]
+        while queue:
+            _, g, state = heapq.heappop(queue)
+            if state[:-1] == goal:
+                break
+            self.nodes_evaluated += 1
+            if self.nodes_evaluated >= self._next_check:
+                self._check()
+            b = state[-1]
+            for m in movelist[b]:
+                q = b + m
+                if locked[q]:
+                    continue
+                child = tuple(b if t == q else t for t in state[:-1]) + (q,)
+                if child not in parents:
+                    parents[child] = (state, m)
+                    heapq.heappush(queue, (g + 1 + estimate(child), g + 1,
+                                           child))
+        else:
+            raise ValueError(f'cannot move tiles {tiles}')
+
+        moves = []
+        while parents[state] is not None:
+            state, m = parents[state]
+            moves.append(m)
+        for m in reversed(moves):
+            self._apply(m)
+
+    def _move_blank(self, target):
+        movelist, locked = self.movelist, self.locked
+        parents = {self.gap: None}
+        queue = deque([self.gap])
+        while target not in parents:
+            b = queue.popleft()
+            for m in movelist[b]:
+                q = b + m
+                if not locked[q] and q not in parents:
+                    parents[q] = (b, m)
+                    queue.append(q)
+        moves = []
+        while parents[target] is not None:
+            target, m = parents[target]
+            moves.append(m)
+        for m in reversed(moves):
+            self._apply(m)
+
+    def _place(self, tile, target):
+        self._move_tiles((tile,), (target,))
+        self.locked[target] = True
+
+    def _place_pair(self, first, second, a, b, a_side, finish):
+        # The last two tiles of a line cannot be placed one after the
+        # other.  The second tile is parked in the first one's cell and
+        # the first one beside it, then both are rotated into place.  They
+        # are moved together, or the first one could be shut in the corner.
+        board = self.board
+        if board[a] == first and board[b] == second:
+            self.locked[a] = self.locked[b] = True
+            return
+        self._move_tiles((second, first), (a, a_side))
+        self.locked[a] = self.locked[a_side] = True
+        self._move_blank(b)
+        self.locked[a] = False
+        self.locked[a_side] = False
+        for m in finish:
+            self._apply(m)
+        self.locked[a] = self.locked[b] = True
+
+    def _solve_row(self, row, left):
+        n = self.n
+        for col in range(left, n - 2):
+            self._place(row * n + col + 1, row * n + col)
+        a, b = row * n + n - 2, row * n + n - 1
+        self._place_pair(a + 1, b + 1, a, b, a + n, (-1, n))
+
+    def _solve_column(self, col, top):
+        n = self.n
+        for row in range(top, n - 2):
+            self._place(row * n + col + 1, row * n + col)
+        a, b = (n - 2) * n + col, (n - 1) * n + col
+        self._place_pair(a + 1, b + 1, a, b, a + 1, (-n, 1))
+
+    def _solve_corner(self, top):
+        n, k = self.n, self.n - top
+        cells = [(top + i) * n + top + j for i in range(k) for j in range(k)]
+        goal = slide_solved_state(n)
+        # Relabel the corner's tiles to the small board's numbering.
+        label = {goal[c]: i + 1 for i, c in enumerate(cells[:-1])}
+        label[0] = 0
+        corner = tuple(label[self.board[c]] for c in cells)
+        # The corner is small enough that it needs no watching.
+        r = self.corner.solve(corner, partial(eq, slide_solved_state(k)))
+        self.nodes_evaluated += self.corner.nodes_evaluated
+        for _, m in r[1]:
+            self._apply(m // k * n if m in (k, -k) else m)
@@ -0,0 +1,373 @@
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import socket
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from operator import eq
+from parallel import slide_engine
+from reduction import ReductionSolver
+from solution_cache import CachedSolver, SolutionCache
+from solver import SolveCancelled, slide_is_solvable, slide_solved_state
+
+
+# Requests and replies are JSON objects, one per line:
+#   {"id": 1, "op": "solve", "board": [...], "deadline": 5}
+#       -> {"id": 1, "moves": ["left", ...], "length": ..., "nodes": ...,
+#           "time": ..., "merged": false}  or  {"id": 1, "error": "..."}
+#   {"id": 2, "op": "cancel", "target": 1}  -> {"id": 2, "cancelled": true}
+#   {"id": 3, "op": "metrics"}              -> {"id": 3, "metrics": {...}}
+# "deadline" is in seconds from receipt and "heuristic" ('wd' or 'pdb')
+# may pick the tables for boards up to 4x4.
+
+ENV = 'GAME15_SOLVER'
+
+
+def parse_address(address):
+    # "host:port" for TCP, anything else is a Unix socket path.
+    host, _, port = address.rpartition(':')
+    if host and port.isdigit():
+        return 'tcp', (host, int(port))
+    return 'unix', address
+
+
+_engines = {}
+_cache = None
+
+
+def _init_worker(sizes, use_cache):
+    global _cache
+    _cache = SolutionCache() if use_cache else None
+    for n in sizes:
+        _engine(n, 'wd')
+
+
+def solver_engine(n, heuristic='wd', cache=None):
+    # Search is out of reach beyond 4x4, and the reduction solver is fast
+    # enough to go without the cache.
+    if n > 4:
+        return ReductionSolver(n)
+    engine = slide_engine(n, heuristic)
+    if cache is not None:
+        engine = CachedSolver(engine, n, cache, heuristic)
+    return engine
+
+
+def _engine(n, heuristic):
+    if (n, heuristic) not in _engines:
+        _engines[n, heuristic] = solver_engine(n, heuristic, _cache)
+    return _engines[n, heuristic]
+
+
+def _solve(n, board, heuristic, cancel):
+    engine = _engine(n, heuristic)
+    names = {-1: 'left', 1: 'right', -n: 'up', n: 'down'}
+    start = time.time()
+    try:
+        _, moves, _, nodes = engine.solve(
+            board, partial(eq, slide_solved_state(n)), cancel=cancel)
+    except SolveCancelled:
+        return None
+    return {'moves': [names[m] for _, m in moves], 'length': len(moves),
+            'nodes': nodes, 'time': round(time.time() - start, 6)}
+
+
+class Job:
+    def __init__(self, cancel):
+        self.cancel = cancel
+        self.waiters = 0
+        self.started = None
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class SolverService:
+    # Solves on a process pool whose workers keep their engines, and the
+    # tables behind them, for their whole life.  At most `workers` jobs
+    # run at once and the rest wait in order.  Requests for a board that
+    # is already queued or running share that job; a job is cancelled,
+    # queued or not, once no request is waiting for it.
+    def __init__(self, workers=None, sizes=(3, 4), use_cache=True,
+                 latencies=1000):
+        self.workers = workers or os.cpu_count()
+        ctx = multiprocessing.get_context()
+        self.manager = ctx.Manager()
+        self.pool = ProcessPoolExecutor(
+            self.workers, mp_context=ctx, initializer=_init_worker,
+            initargs=(sizes, use_cache))
+        self.slots = None
+        self.jobs = {}
+        self.latency = deque(maxlen=latencies)
+        self.solve_time = deque(maxlen=latencies)
+        self.counts = dict.fromkeys(
+            ['requests', 'merged', 'solved', 'cancelled', 'deadline',
+             'errors'], 0)
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        self.manager.shutdown()
+
+    async def serve(self, address):
+        self.slots = asyncio.Semaphore(self.workers)
+        kind, where = parse_address(address)
+        if kind == 'tcp':
+            server = await asyncio.start_server(self.handle, *where)
+        else:
+            if os.path.exists(where):
+                os.unlink(where)
+            server = await asyncio.start_unix_server(self.handle, where)
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        # Request ids are only unique within a connection.
+        active = {}
+
+        async def reply(message):
+            async with lock:
+                writer.write(json.dumps(message).encode() + b'\n')
+                await writer.drain()
+
+        async def answer(request):
+            try:
+                await reply(dict(await self.dispatch(request, active),
+                                 id=request.get('id')))
+            except ConnectionError:
+                pass
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError:
+                    await reply({'error': 'bad request'})
+                    continue
+                task = asyncio.ensure_future(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except ConnectionError:
+            pass
+        finally:
+            # Requests of a closed connection are dropped, and with them
+            # any job nobody else waits for.
+            for task in list(tasks):
+                task.cancel()
+            writer.close()
+
+    async def dispatch(self, request, active):
+        op = request.get('op', 'solve')
+        if op == 'metrics':
+            return {'metrics': self.metrics()}
+        if op == 'cancel':
+            task = active.get(request.get('target'))
+            if task is not None:
+                task.cancel()
+            return {'cancelled': task is not None}
+        if op != 'solve':
+            return {'error': f'unknown op {op!r}'}
+
+        self.counts['requests'] += 1
+        try:
+            board = tuple(request['board'])
+            n = int(len(board) ** 0.5)
+            if n < 2 or n * n != len(board) or \
+                    sorted(board) != list(range(n * n)):
+                raise ValueError('not a square board of tiles 0..n*n-1')
+            if not slide_is_solvable(board):
+                raise ValueError('unsolvable')
+            heuristic = request.get('heuristic', 'wd')
+            if heuristic not in ('wd', 'pdb'):
+                raise ValueError(f'unknown heuristic {heuristic!r}')
+        except (KeyError, TypeError, ValueError) as e:
+            self.counts['errors'] += 1
+            return {'error': str(e)}
+
+        start = time.monotonic()
+        task = asyncio.current_task()
+        rid = request.get('id')
+        if rid is not None:
+            active[rid] = task
+        try:
+            result = await asyncio.wait_for(
+                self.submit(n, board, heuristic), request.get('deadline'))
+        except asyncio.TimeoutError:
+            self.counts['deadline'] += 1
+            return {'error': 'deadline exceeded'}
+        except asyncio.CancelledError:
+            self.counts['cancelled'] += 1
+            return {'error': 'cancelled'}
+        except Exception as e:
+            return {'error': f'{type(e).__name__}: {e}'}
+        finally:
+            if active.get(rid) is task:
+                del active[rid]
+        self.latency.append(time.monotonic() - start)
+        return result
+
+    async def submit(self, n, board, heuristic):
+        key = (board, heuristic if n <= 4 else None)
+        job = self.jobs.get(key)
+        merged = job is not None
+        if merged:
+            self.counts['merged'] += 1
+        else:
+            job = self.jobs[key] = Job(self.manager.Event())
+            asyncio.ensure_future(self.run(key, job, n, board, heuristic))
+        job.waiters += 1
+        try:
+            result = await asyncio.shield(job.future)
+        finally:
+            job.waiters -= 1
+            if not job.waiters and not job.future.done():
+                job.cancel.set()
+                if self.jobs.get(key) is job:
+                    del self.jobs[key]
+        return dict(result, merged=merged)
+
+    async def run(self, key, job, n, board, heuristic):
+        loop = asyncio.get_running_loop()
+        try:
+            async with self.slots:
+                if job.cancel.is_set():
+                    return
+                job.started = time.monotonic()
+                result = await loop.run_in_executor(
+                    self.pool, _solve, n, board, heuristic, job.cancel)
+        except Exception as e:
+            self.counts['errors'] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+            return
+        finally:
+            if self.jobs.get(key) is job:
+                del self.jobs[key]
+        if result is None:
+            return
+        self.counts['solved'] += 1
+        self.solve_time.append(result['time'])
+        if not job.future.done():
+            job.future.set_result(result)
+
+    def metrics(self):
+        def percentile(values, q):
+            if not values:
+                return None
+            values = sorted(values)
+            return values[min(len(values) - 1, int(q * len(values)))]
+
+        running = sum(1 for job in self.jobs.values()
+                      if job.started is not None)
+        return dict(
+            self.counts,
+            workers=self.workers,
+            running=running,
+            queued=len(self.jobs) - running,
+            waiting=sum(job.waiters for job in self.jobs.values()),
+            latency_p50=percentile(self.latency, 0.5),
+            latency_p95=percentile(self.latency, 0.95),
+            latency_max=max(self.latency, default=None),
+            solve_time_mean=sum(self.solve_time) / len(self.solve_time)
+            if self.solve_time else None,
+        )
+
+
+class SolverClient:
+    # Blocking client for SolverService, for callers on plain threads such
+    # as the game's solver thread.  solve() checks `cancel` every `poll`
+    # seconds and withdraws the request when it is set.
+    def __init__(self, address=None, poll=0.1):
+        kind, where = parse_address(address or os.environ[ENV])
+        family = socket.AF_INET if kind == 'tcp' else socket.AF_UNIX
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.connect(where)
+        self.sock.settimeout(poll)
+        self.buffer = b''
+        self.ids = itertools.count(1)
+        self.replies = {}
+
+    def close(self):
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, message, cancel=None):
+        rid = message['id'] = next(self.ids)
+        self._send(message)
+        cancelled = False
+        while rid not in self.replies:
+            if cancel is not None and cancel.is_set() and not cancelled:
+                cancelled = True
+                self._send({'id': next(self.ids), 'op': 'cancel',
+                            'target': rid})
+            self._read()
+        reply = self.replies.pop(rid)
+        if cancelled and 'error' in reply:
+            raise SolveCancelled('cancelled')
+        return reply
+
+    def solve(self, board, deadline=None, heuristic='wd', cancel=None):
+        reply = self.request({'op': 'solve', 'board': list(board),
+                              'deadline': deadline, 'heuristic': heuristic},
+                             cancel)
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    def metrics(self):
+        return self.request({'op': 'metrics'})['metrics']
+
+    def _send(self, message):
+        self.sock.sendall(json.dumps(message).encode() + b'\n')
+
+    def _read(self):
+        try:
+            data = self.sock.recv(65536)
+        except socket.timeout:
+            return
+        if not data:
+            raise ConnectionError('solver service closed the connection')
+        self.buffer += data
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            reply = json.loads(line)
+            self.replies[reply.get('id')] = reply
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve solves over a local socket, one JSON request '
+                    'per line.')
+    parser.add_argument('address', nargs='?', default=os.environ.get(ENV),
+                        help=f'"host:port" or a Unix socket path '
+                             f'(default ${ENV})')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not read or write the solution cache')
+    args = parser.parse_args()
+    if not args.address:
+        parser.error(f'no address given and ${ENV} is not set')
+
+    service = SolverService(args.workers, use_cache=not args.no_cache)
+    try:
+        asyncio.run(service.serve(args.address))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, wait
+import service
+from solution_cache import SolutionCache
+from solver import SolveCancelled
+
+
+_generation = None
+
+
+def _init_worker(generation, sizes, use_cache):
+    global _generation
+    _generation = generation
+    if hasattr(os, 'nice'):
+        os.nice(10)
+    service._init_worker(sizes, use_cache)
+
+
+class _Stale:
+    # Set, as far as SolveMonitor can tell, once a newer speculation has
+    # been asked for.
+    def __init__(self, generation):
+        self.generation = generation
+
+    def is_set(self):
+        return _generation.value != self.generation
+
+
+def _speculate(n, board, heuristic, generation):
+    if _generation.value != generation:
+        return None
+    return service._solve(n, board, heuristic, _Stale(generation))
+
+
+class SolverSession:
+    # Solver state that outlives single solves: engines (and the tables
+    # behind them) built once per size and heuristic, and one low-priority
+    # process that solves the board in play ahead of time.  Both warm up in
+    # the background.  Speculations are numbered; bumping the number stops
+    # the running one and any still queued.
+    def __init__(self, sizes=(3, 4), use_cache=True):
+        # The worker starts on the first speculation, by which time the
+        # warm-up thread is running, so it is spawned rather than forked.
+        ctx = multiprocessing.get_context('spawn')
+        self.generation = ctx.Value('i', 0)
+        self.pool = ProcessPoolExecutor(
+            1, mp_context=ctx, initializer=_init_worker,
+            initargs=(self.generation, sizes, use_cache))
+        self.cache = SolutionCache() if use_cache else None
+        self.engines = {}
+        self.lock = threading.Lock()
+        self.key = None
+        self.future = None
+        threading.Thread(target=self._warm, args=(sizes,),
+                         daemon=True).start()
+
+    def _warm(self, sizes):
+        for n in sizes:
+            self.engine(n)
+
+    def engine(self, n, heuristic='wd'):
+        if n > 4:
+            heuristic = 'wd'
+        with self.lock:
+            if (n, heuristic) not in self.engines:
+                self.engines[n, heuristic] = service.solver_engine(
+                    n, heuristic, self.cache)
+            return self.engines[n, heuristic]
+
+    def speculate(self, board, n, heuristic='wd'):
+        key = (tuple(board), heuristic)
+        if key == self.key:
+            return
+        with self.generation.get_lock():
+            self.generation.value += 1
+            generation = self.generation.value
+        self.key = key
+        self.future = self.pool.submit(_speculate, n, key[0], heuristic,
+                                       generation)
+
+    def cancel(self):
+        if self.key is not None:
+            with self.generation.get_lock():
+                self.generation.value += 1
+            self.key = None
+            self.future = None
+
+    def result(self, board, heuristic='wd', cancel=None, poll=0.1):
+        # The moves found by the speculation on this board, waiting for it
+        # if need be, or None when there is none for it.
+        future = self.future
+        if (tuple(board), heuristic) != self.key or future is None:
+            return None
+        while not wait([future], poll).done:
+            if cancel is not None and cancel.is_set():
+                raise SolveCancelled('cancelled')
+        result = future.result()
+        return None if result is None else result['moves']
+
+    def ready(self):
+        # (board, moves) from the last speculation once it has finished.
+        future = self.future
+        if future is None or not future.done() or \
+                future.exception() is not None or future.result() is None:
+            return None
+        return self.key[0], future.result()['moves']
+
+    def close(self):
+        self.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,155 @@
+import sqlite3
+import threading
+import time
+from solver import cache_path, slide_solved_state
+
+
+def slide_transpose(p, n):
+    # Mirrors the board in its main diagonal and renames every tile after
+    # its mirrored goal cell, so the solved state maps to itself.
+    q = [0] * (n * n)
+    for i, t in enumerate(p):
+        r, c = divmod(i, n)
+        if t:
+            tr, tc = divmod(t - 1, n)
+            t = tc * n + tr + 1
+        q[c * n + r] = t
+    return tuple(q)
+
+
+def slide_canonical(p, n):
+    # Returns the canonical board and whether it is the transposed one.
+    t = slide_transpose(p, n)
+    return (t, True) if t < tuple(p) else (tuple(p), False)
+
+
+class SolutionCache:
+    # Solutions on disk, keyed on the heuristic that found them and the
+    # canonical board, and stored as blank moves ('l', 'r', 'u', 'd').  Only
+    # 'pdb' is admissible: the default 'wd' (walking distance plus linear
+    # conflicts) sometimes overestimates, so its solutions are what that
+    # engine returns, not always the shortest.  Past max_entries the least
+    # recently used solutions are dropped.
+    flip = str.maketrans('lrud', 'udlr')
+
+    def __init__(self, path=None, max_entries=100000):
+        self.path = path or cache_path('solutions.sqlite')
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(self.path, timeout=30,
+                                  check_same_thread=False)
+        with self.db:
+            # Solutions were once keyed on the board alone, mixing 'wd'
+            # ones with 'pdb' ones; which is which is not known, so those
+            # are dropped.
+            columns = [row[1] for row in self.db.execute(
+                'PRAGMA table_info(solutions)')]
+            if columns and 'heuristic' not in columns:
+                self.db.execute('DROP TABLE solutions')
+            self.db.execute('CREATE TABLE IF NOT EXISTS solutions ('
+                            'heuristic TEXT NOT NULL, board BLOB NOT NULL, '
+                            'moves TEXT NOT NULL, used REAL NOT NULL, '
+                            'PRIMARY KEY (heuristic, board))')
+            self.db.execute('CREATE INDEX IF NOT EXISTS solutions_used '
+                            'ON solutions (used)')
+            # Counted once here and then kept up to date by put(), which
+            # would otherwise count the table on every insert.
+            self.count, = self.db.execute(
+                'SELECT COUNT(*) FROM solutions').fetchone()
+
+    def close(self):
+        self.db.close()
+
+    def get(self, board, n, heuristic=None):
+        # With no heuristic, the shortest solution stored under any.
+        key, transposed = slide_canonical(board, n)
+        with self.lock, self.db:
+            if heuristic is None:
+                row = self.db.execute(
+                    'SELECT moves, heuristic FROM solutions WHERE board=? '
+                    'ORDER BY length(moves) LIMIT 1',
+                    (bytes(key),)).fetchone()
+            else:
+                row = self.db.execute(
+                    'SELECT moves, heuristic FROM solutions '
+                    'WHERE heuristic=? AND board=?',
+                    (heuristic, bytes(key))).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE solutions SET used=? '
+                            'WHERE heuristic=? AND board=?',
+                            (time.time(), row[1], bytes(key)))
+        moves = row[0].translate(self.flip) if transposed else row[0]
+        steps = {'l': -1, 'r': 1, 'u': -n, 'd': n}
+        return [steps[m] for m in moves]
+
+    def put(self, board, n, heuristic, moves):
+        key, transposed = slide_canonical(board, n)
+        names = {-1: 'l', 1: 'r', -n: 'u', n: 'd'}
+        moves = ''.join(names[m] for m in moves)
+        if transposed:
+            moves = moves.translate(self.flip)
+        with self.lock, self.db:
+            new = self.db.execute(
+                'SELECT 1 FROM solutions WHERE heuristic=? AND board=?',
+                (heuristic, bytes(key))).fetchone() is None
+            self.db.execute(
+                'INSERT OR REPLACE INTO solutions VALUES (?, ?, ?, ?)',
+                (heuristic, bytes(key), moves, time.time()))
+            self.count += new
+            if self.count > self.max_entries:
+                # Other processes share the file, so the table is counted
+                # again before evicting.  A tenth is dropped at a time, so
+                # that eviction is rare.
+                count, = self.db.execute(
+                    'SELECT COUNT(*) FROM solutions').fetchone()
+                if count > self.max_entries:
+                    drop = count - self.max_entries + self.max_entries // 10
+                    self.db.execute(
+                        'DELETE FROM solutions WHERE rowid IN (SELECT rowid '
+                        'FROM solutions ORDER BY used LIMIT ?)', (drop,))
+                    count -= drop
+                self.count = count
+
+
+class CachedSolver:
+    # Wraps any engine with the usual solve() signature, under the name of
+    # the heuristic it searches with.  Only searches for the usual solved
+    # state go through the cache, and only finished ones are stored: an
+    # anytime engine's best-so-far (self.optimal False) is not.
+    def __init__(self, engine, n, cache, heuristic):
+        self.engine = engine
+        self.n = n
+        self.cache = cache
+        self.heuristic = heuristic
+        self.goal = slide_solved_state(n)
+
+    def __getattr__(self, name):
+        return getattr(self.engine, name)
+
+    def solve(self, root, is_goal, max_cost=None, **kwargs):
+        if not is_goal(self.goal):
+            return self.engine.solve(root, is_goal, max_cost, **kwargs)
+        moves = self.cache.get(root, self.n, self.heuristic)
+        if moves is not None:
+            self.nodes_evaluated = 0
+            if max_cost is not None and len(moves) > max_cost:
+                return None
+            p = list(root)
+            gap = p.index(0)
+            path = [tuple(p)]
+            path_descrs = []
+            for m in moves:
+                tile = p[gap + m]
+                p[gap], p[gap + m] = tile, 0
+                gap += m
+                path.append(tuple(p))
+                path_descrs.append((tile, m))
+            return path, path_descrs, len(moves), 0
+
+        r = self.engine.solve(root, is_goal, max_cost, **kwargs)
+        self.nodes_evaluated = self.engine.nodes_evaluated
+        if r is not None and getattr(self.engine, 'optimal', True):
+            self.cache.put(root, self.n, self.heuristic,
+                           [m for _, m in r[1]])
+        return r
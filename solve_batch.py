@@ -0,0 +1,124 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from operator import eq
+from service import solver_engine
+from solution_cache import SolutionCache
+from solver import slide_is_solvable, slide_solved_state
+
+
+_engines = {}
+_heuristic = 'wd'
+_cache = None
+
+
+def _init_worker(heuristic, use_cache=True):
+    global _heuristic, _cache
+    _heuristic = heuristic
+    _cache = SolutionCache() if use_cache else None
+
+
+def parse_board(line):
+    p = tuple(int(c) for c in line.replace(',', ' ').split())
+    n = int(len(p) ** 0.5)
+    if n < 2 or n * n != len(p) or sorted(p) != list(range(n * n)):
+        raise ValueError('not a square board of tiles 0..n*n-1')
+    return n, p
+
+
+def solve_board(number, line):
+    result = {'line': number}
+    try:
+        n, board = parse_board(line)
+    except ValueError as e:
+        result['error'] = str(e)
+        return result
+    result['board'] = board
+    if not slide_is_solvable(board):
+        result['error'] = 'unsolvable'
+        return result
+
+    # Engines, and the tables behind them, are built once per worker and
+    # board size; the tables themselves come from the on-disk cache.
+    # Boards past 4x4 go to the reduction solver, as in the service.
+    if n not in _engines:
+        try:
+            _engines[n] = solver_engine(n, _heuristic, _cache)
+        except ValueError as e:
+            result['error'] = str(e)
+            return result
+    engine = _engines[n]
+    names = {-1: 'left', 1: 'right', -n: 'up', n: 'down'}
+    start = time.time()
+    _, moves, _, nodes = engine.solve(board,
+                                      partial(eq, slide_solved_state(n)))
+    result['moves'] = [names[m] for _, m in moves]
+    result['length'] = len(moves)
+    result['nodes'] = nodes
+    result['time'] = round(time.time() - start, 6)
+    return result
+
+
+def read_boards(f):
+    for number, line in enumerate(f, 1):
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield number, line
+
+
+def solve_stream(lines, out, workers=None, heuristic='wd', window=None,
+                 use_cache=True):
+    workers = workers or os.cpu_count()
+    window = window or workers * 4
+    pending = deque()
+    warm = set()
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(heuristic, use_cache)) as pool:
+        for number, line in lines:
+            # Build each board size's tables here first, so the workers
+            # load them from the cache instead of all building them.
+            try:
+                n = parse_board(line)[0]
+                if n not in warm:
+                    warm.add(n)
+                    solver_engine(n, heuristic)
+            except ValueError:
+                pass
+            pending.append(pool.submit(solve_board, number, line))
+            # Results are written in input order and at most `window`
+            # boards are held in memory at once.
+            while len(pending) >= window or pending and pending[0].done():
+                out.write(json.dumps(pending.popleft().result()) + '\n')
+        while pending:
+            out.write(json.dumps(pending.popleft().result()) + '\n')
+    out.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Solve sliding puzzles, one board per line, '
+                    'writing one JSON result per line.')
+    parser.add_argument('input', nargs='?', default='-',
+                        help='file with boards, "-" for stdin')
+    parser.add_argument('-o', '--output', default='-',
+                        help='file for results, "-" for stdout')
+    parser.add_argument('-j', '--workers', type=int, default=None)
+    parser.add_argument('--heuristic', choices=['wd', 'pdb'], default='wd')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='do not read or write the solution cache')
+    args = parser.parse_args()
+
+    f = sys.stdin if args.input == '-' else open(args.input)
+    out = sys.stdout if args.output == '-' else open(args.output, 'w')
+    with f, out:
+        solve_stream(read_boards(f), out, args.workers, args.heuristic,
+                     use_cache=not args.no_cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,427 @@
+import heapq
+import os
+import tempfile
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from itertools import repeat
+
+
+CACHE_DIR = os.environ.get(
+    'GAME15_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'game15'))
+
+
+def cache_path(name):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, name)
+
+
+def write_cache_file(path, write, mode='wb'):
+    # write(f) fills a temporary file of its own next to path, which then
+    # replaces path.  Processes building the same table at once each use
+    # their own, and losing the rename to one of them is fine once path
+    # exists.
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path),
+                               prefix=os.path.basename(path) + '.')
+    try:
+        with os.fdopen(fd, mode) as f:
+            write(f)
+        os.replace(tmp, path)
+    except OSError:
+        if not os.path.exists(path):
+            raise
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+class SolveCancelled(Exception):
+    pass
+
+
+class SolveTimeout(SolveCancelled):
+    pass
+
+
+class SolveMonitor:
+    # Cancellation, budgets and progress reports for the engines.  The
+    # search calls _check() once nodes_evaluated reaches _next_check, which
+    # stays at infinity when nothing is watched.  Engines call
+    # _iteration() as each IDA* iteration starts, for SolveStats.
+    check_interval = 1024
+    stats = None
+
+    def _watch(self, cancel=None, time_limit=None, node_limit=None,
+               progress=None, progress_interval=0.5):
+        self.cancel = cancel
+        self.node_limit = node_limit
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.started = time.monotonic()
+        self.deadline = None if time_limit is None else \
+            self.started + time_limit
+        self._next_progress = self.started + progress_interval
+        self.bound = None
+        if cancel is None and time_limit is None and node_limit is None \
+                and progress is None:
+            self._next_check = float('inf')
+        else:
+            self._next_check = self.check_interval
+
+    def _check(self):
+        self._next_check = self.nodes_evaluated + self.check_interval
+        now = time.monotonic()
+        if self.cancel is not None and self.cancel.is_set():
+            raise SolveCancelled('cancelled')
+        if self.deadline is not None and now > self.deadline:
+            raise SolveTimeout('time budget exceeded')
+        if self.node_limit is not None and \
+                self.nodes_evaluated > self.node_limit:
+            raise SolveTimeout('node budget exceeded')
+        if self.progress is not None and now >= self._next_progress:
+            self._next_progress = now + self.progress_interval
+            self.report(now)
+
+    def _iteration(self, bound):
+        self.bound = bound
+        if self.stats is not None:
+            self.stats.iteration(self, bound)
+
+    def report(self, now=None):
+        elapsed = (now or time.monotonic()) - self.started
+        self.progress({
+            'bound': self.bound,
+            'nodes': self.nodes_evaluated,
+            'elapsed': elapsed,
+            'nodes_per_sec': self.nodes_evaluated / elapsed if elapsed else 0,
+        })
+
+
 # https://codegolf.stackexchange.com/questions/6884/solve-the-15-puzzle-the-tile-sliding-puzzle
-class IDAStar:
+class IDAStar(SolveMonitor):
     def __init__(self, h, neighbours):
         self.h = h
         self.neighbours = neighbours
         self.FOUND = object()
+        self._watch()
 
-    def solve(self, root, is_goal, max_cost=None):
-        self.is_goal = is_goal
-        self.path = [root]
-        self.is_in_path = {root}
-        self.path_descrs = []
-        self.nodes_evaluated = 0
+    def solve(self, root, is_goal, max_cost=None, **watch):
+        self._watch(**watch)
+        self._reset([root], [], is_goal)
 
         bound = self.h(root)
 
-        while True:
+        while max_cost is None or bound <= max_cost:
+            self._iteration(bound)
             t = self._search(0, bound)
             if t is self.FOUND:
                 return self.path, self.path_descrs, bound, self.nodes_evaluated
             if t is None:
                 return None
             bound = t
+        return None
+
+    def _reset(self, path, path_descrs, is_goal):
+        self.is_goal = is_goal
+        self.path = path
+        self.is_in_path = set(path)
+        self.path_descrs = path_descrs
+        self.nodes_evaluated = 0
+
+    def _search(self, g, bound):
+        self.nodes_evaluated += 1
+        if self.nodes_evaluated >= self._next_check:
+            self._check()
+
+        node = self.path[-1]
+        f = g + self.h(node)
+        if f > bound:
+            return f
+        if self.is_goal(node):
+            return self.FOUND
+
+        m = None
+        for cost, n, descr in self.neighbours(node):
+            if n in self.is_in_path:
+                continue
+
+            self.path.append(n)
+            self.is_in_path.add(n)
+            self.path_descrs.append(descr)
+            t = self._search(g + cost, bound)
+
+            if t == self.FOUND:
+                return self.FOUND
+            if m is None or (t is not None and t < m):
+                m = t
+
+            self.path.pop()
+            self.path_descrs.pop()
+            self.is_in_path.remove(n)
+
+        return m
+
+
+class IncrementalIDAStar(IDAStar):
+    # h must provide key(p), value(key) and update(key, child, descr), like
+    # SlideWD: the heuristic is carried along the path and updated from the
+    # parent's key and the move instead of being recomputed per node.
+    def _reset(self, path, path_descrs, is_goal):
+        super()._reset(path, path_descrs, is_goal)
+        self.keys = [self.h.key(path[-1])]
+
+    def _search(self, g, bound):
+        self.nodes_evaluated += 1
+        if self.nodes_evaluated >= self._next_check:
+            self._check()
+
+        node = self.path[-1]
+        key = self.keys[-1]
+        h = self.h.value(key)
+        f = g + h
+        if f > bound:
+            return f
+        if h == 0 and self.is_goal(node):
+            return self.FOUND
+
+        m = None
+        for cost, n, descr in self.neighbours(node):
+            if n in self.is_in_path:
+                continue
+
+            self.path.append(n)
+            self.is_in_path.add(n)
+            self.path_descrs.append(descr)
+            self.keys.append(self.h.update(key, n, descr))
+            t = self._search(g + cost, bound)
+
+            if t == self.FOUND:
+                return self.FOUND
+            if m is None or (t is not None and t < m):
+                m = t
+
+            self.path.pop()
+            self.path_descrs.pop()
+            self.is_in_path.remove(n)
+            self.keys.pop()
+
+        return m
+
+
+class PerimeterIDAStar(IncrementalIDAStar):
+    # Forward IDA* that stops at a Perimeter around the goal: boards on it
+    # have exact distances.  Every path from a board off it to the goal
+    # crosses its rim (the boards exactly depth moves out), so the board is
+    # at least depth moves plus its Manhattan distance to the nearest rim
+    # board away, after Manzini's BIDA*.  Each node keeps the rim boards
+    # still within the bound: a move changes a Manhattan distance by one,
+    # so f towards a rim board never drops along a path, and a rim board
+    # out of bound stays out below that node.
+    def __init__(self, h, neighbours, perimeter):
+        super().__init__(h, neighbours)
+        self.perimeter = perimeter
+        n = perimeter.n
+        cells = n * n
+        # A board's distance has the parity of the blank's distance from
+        # its goal cell, so the floor for boards off the perimeter is the
+        # first value past depth with that parity.
+        self.floor = [perimeter.depth + 1 +
+                      (perimeter.depth + 1 + n - 1 - gap % n +
+                       n - 1 - gap // n) % 2 for gap in range(cells)]
+        self.cell_dist = [[abs(a % n - b % n) + abs(a // n - b // n)
+                           for b in range(cells)] for a in range(cells)]
+        # The cell of every tile on each rim board.
+        self.rim = []
+        for p, d in perimeter.dist.items():
+            if d == perimeter.depth:
+                where = [0] * cells
+                for i, t in enumerate(p):
+                    where[t] = i
+                self.rim.append(where)
+
+    def _reset(self, path, path_descrs, is_goal):
+        super()._reset(path, path_descrs, is_goal)
+        root = path[-1]
+        dist = self.cell_dist
+        # (rim board, Manhattan distance) pairs and the least f of the
+        # rim boards already dropped, per node on the path.
+        self.fronts = [([(k, sum(dist[i][where[t]]
+                                 for i, t in enumerate(root) if t))
+                         for k, where in enumerate(self.rim)], None)]
+
+    def solve(self, root, is_goal, max_cost=None, **watch):
+        r = super().solve(root, is_goal, max_cost, **watch)
+        if r is None:
+            return None
+        path, path_descrs, bound, nodes_evaluated = r
+        path = list(path)
+        path_descrs = list(path_descrs)
+        for p, descr in self.perimeter.path_to_goal(path[-1]):
+            path.append(p)
+            path_descrs.append(descr)
+        return path, path_descrs, bound, nodes_evaluated
+
+    def _search(self, g, bound):
+        self.nodes_evaluated += 1
+        if self.nodes_evaluated >= self._next_check:
+            self._check()
+
+        node = self.path[-1]
+        key = self.keys[-1]
+        d = self.perimeter.dist.get(node)
+        if d is not None:
+            f = g + d
+            return f if f > bound else self.FOUND
+        h = self.h.value(key)
+        floor = self.floor[key[3]]
+        if h < floor:
+            h = floor
+        f = g + h
+        if f > bound:
+            return f
+
+        front, dropped = self.fronts[-1]
+        rim, depth = self.rim, self.perimeter.depth
+        to = frm = None
+        if self.path_descrs:
+            # Tile c slid from this node's gap into its parent's.
+            c, mv = self.path_descrs[-1]
+            to, frm = self.cell_dist[key[3] - mv], self.cell_dist[key[3]]
+        kept = []
+        for k, v in front:
+            if to is not None:
+                cell = rim[k][c]
+                v += to[cell] - frm[cell]
+            f = g + v + depth
+            if f > bound:
+                if dropped is None or f < dropped:
+                    dropped = f
+            else:
+                kept.append((k, v))
+        if not kept:
+            return dropped
+        front = kept
+        self.fronts.append((front, dropped))
+
+        m = None
+        for cost, n, descr in self.neighbours(node):
+            if n in self.is_in_path:
+                continue
+
+            self.path.append(n)
+            self.is_in_path.add(n)
+            self.path_descrs.append(descr)
+            self.keys.append(self.h.update(key, n, descr))
+            t = self._search(g + cost, bound)
+
+            if t == self.FOUND:
+                return self.FOUND
+            if m is None or (t is not None and t < m):
+                m = t
+
+            self.path.pop()
+            self.path_descrs.pop()
+            self.is_in_path.remove(n)
+            self.keys.pop()
+
+        self.fronts.pop()
+        if dropped is not None and (m is None or dropped < m):
+            m = dropped
+        return m
+
+
+class PackedIDAStar(IncrementalIDAStar):
+    # Searches over slide_pack() ints with slide_packed_neighbours and
+    # slide_packed_wd, but takes and returns tuple boards like IDAStar.
+    # pack() turns a board into what h and neighbours take.
+    def pack(self, board):
+        return slide_pack(board)
+
+    def solve(self, root, is_goal, max_cost=None, **watch):
+        n = int(len(root) ** 0.5)
+        r = super().solve(self.pack(root),
+                          lambda p: is_goal(slide_unpack(p, n)), max_cost,
+                          **watch)
+        if r is None:
+            return None
+        path, path_descrs, bound, nodes_evaluated = r
+        return ([slide_unpack(p, n) for p in path], path_descrs, bound,
+                nodes_evaluated)
+
+
+class TTIDAStar(IDAStar):
+    # IDA* with a bounded transposition table of board -> (best g,
+    # backed-up h).  A stored value is only trusted when the board is
+    # reached again at a g no smaller than the stored one, where any path
+    # it ignored is dominated by one through the earlier visit.  policy is
+    # 'lru' or 'two-tier': boards hash to buckets of two slots, one keeping
+    # the entry found closest to the root and one always taking the
+    # newest, including whatever the first slot gives up.
+    def __init__(self, h, neighbours, max_entries=1 << 20, policy='lru'):
+        super().__init__(h, neighbours)
+        self.max_entries = max_entries
+        self.policy = policy
+
+    def _reset(self, path, path_descrs, is_goal):
+        super()._reset(path, path_descrs, is_goal)
+        if self.policy == 'two-tier':
+            self.buckets = max(1, self.max_entries // 2)
+            self.deep = [None] * self.buckets
+            self.recent = [None] * self.buckets
+        else:
+            self.table = OrderedDict()
+        self.tt_probes = 0
+        self.tt_hits = 0
+
+    @property
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0
+
+    def _lookup(self, node):
+        # (best g, backed-up h) for the board, or None.
+        if self.policy == 'two-tier':
+            i = hash(node) % self.buckets
+            for entry in (self.deep[i], self.recent[i]):
+                if entry is not None and entry[0] == node:
+                    return entry[1:]
+            return None
+        entry = self.table.get(node)
+        if entry is not None:
+            self.table.move_to_end(node)
+        return entry
+
+    def _store(self, node, g, h):
+        if self.policy == 'two-tier':
+            i = hash(node) % self.buckets
+            deep, recent = self.deep[i], self.recent[i]
+            if deep is not None and deep[0] == node:
+                if deep[1] >= g:
+                    self.deep[i] = node, g, h
+                return
+            if recent is not None and recent[0] == node:
+                if recent[1] < g:
+                    return
+                recent = None
+            if deep is None or deep[1] >= g:
+                self.deep[i] = node, g, h
+                self.recent[i] = deep or recent
+            else:
+                self.recent[i] = node, g, h
+            return
+        table = self.table
+        entry = table.get(node)
+        if entry is not None:
+            if entry[0] < g:
+                return
+        elif len(table) >= self.max_entries:
+            table.popitem(last=False)
+        table[node] = (g, h)
 
     def _search(self, g, bound):
         self.nodes_evaluated += 1
+        if self.nodes_evaluated >= self._next_check:
+            self._check()
 
         node = self.path[-1]
         f = g + self.h(node)
@@ -32,6 +430,13 @@ class IDAStar:
         if self.is_goal(node):
             return self.FOUND
 
+        self.tt_probes += 1
+        entry = self._lookup(node)
+        if entry is not None:
+            self.tt_hits += 1
+            if g >= entry[0] and g + entry[1] > bound:
+                return g + entry[1]
+
         m = None
         for cost, n, descr in self.neighbours(node):
             if n in self.is_in_path:
@@ -51,13 +456,293 @@ class IDAStar:
             self.path_descrs.pop()
             self.is_in_path.remove(n)
 
+        if m is not None:
+            self._store(node, g, m - g)
         return m
 
 
+class StackIDAStar(SolveMonitor):
+    # Iterative IDA* for sliding puzzles: one board is mutated in place and
+    # the path lives in preallocated per-depth arrays.  Cycles are avoided
+    # only by never undoing the previous move, or, given an automaton (see
+    # fsm.slide_automaton), by refusing every move string it rejects.  h
+    # must be incremental (see SlideWD).
+    def __init__(self, h, n, automaton=None):
+        self.h = h
+        self.n = n
+        self.automaton = automaton
+        self.movelist = []
+        for gap in range(n * n):
+            x, y = gap % n, gap // n
+            moves = []
+            if x > 0:
+                moves.append(-1)
+            if x < n - 1:
+                moves.append(+1)
+            if y > 0:
+                moves.append(-n)
+            if y < n - 1:
+                moves.append(+n)
+            self.movelist.append(moves)
+
+    def solve(self, root, is_goal, max_cost=None, **watch):
+        self._watch(**watch)
+        self.nodes_evaluated = 0
+        board = list(root)
+        key = self.h.key(root)
+        bound = self.h.value(key)
+
+        while max_cost is None or bound <= max_cost:
+            self._iteration(bound)
+            t = self._search(board, key, bound, is_goal)
+            if t is True:
+                path = [root]
+                path_descrs = []
+                p = list(root)
+                for depth in range(self.depth):
+                    gap, m = self.gaps[depth], self.moves[depth]
+                    p[gap], p[gap + m] = p[gap + m], 0
+                    path.append(tuple(p))
+                    path_descrs.append((p[gap], m))
+                return path, path_descrs, bound, self.nodes_evaluated
+            if t is None:
+                return None
+            bound = t
+        return None
+
+    def _search(self, board, key, bound, is_goal):
+        update, value, movelist = self.h.update, self.h.value, self.movelist
+        # g never exceeds the bound, so bound + 1 slots always suffice.
+        size = int(bound) + 1
+        self.gaps = gaps = [0] * size
+        self.moves = moves = [0] * size
+        keys = [None] * size
+        choice = [0] * size
+        fsm = self.automaton.table if self.automaton is not None else None
+        states = [0] * size
+        gaps[0] = key[3]
+        keys[0] = key
+        nodes = 0
+        m = None
+        depth = 0
+        expand = True
+
+        while True:
+            if expand:
+                nodes += 1
+                if self.nodes_evaluated + nodes >= self._next_check:
+                    self.nodes_evaluated += nodes
+                    nodes = 0
+                    self._check()
+                h = value(keys[depth])
+                f = depth + h
+                if f > bound:
+                    if m is None or f < m:
+                        m = f
+                    expand = False
+                elif h == 0 and is_goal(tuple(board)):
+                    self.nodes_evaluated += nodes
+                    self.depth = depth
+                    return True
+                else:
+                    choice[depth] = 0
+
+            if not expand:
+                # Step back to the parent and undo the move into this node.
+                if depth == 0:
+                    self.nodes_evaluated += nodes
+                    return m
+                depth -= 1
+                gap, mv = gaps[depth], moves[depth]
+                board[gap + mv] = board[gap]
+                board[gap] = 0
+
+            gap = gaps[depth]
+            options = movelist[gap]
+            i = choice[depth]
+            if fsm is None:
+                if i < len(options) and depth and \
+                        options[i] == -moves[depth - 1]:
+                    i += 1
+            else:
+                row = fsm[states[depth]]
+                while i < len(options) and row[options[i]] < 0:
+                    i += 1
+            if i == len(options):
+                expand = False
+                continue
+            choice[depth] = i + 1
+            mv = options[i]
+            if fsm is not None:
+                states[depth + 1] = row[mv]
+            c = board[gap + mv]
+            board[gap] = c
+            board[gap + mv] = 0
+            moves[depth] = mv
+            keys[depth + 1] = update(keys[depth], board, (c, mv))
+            gaps[depth + 1] = gap + mv
+            depth += 1
+            expand = True
+
+
+class WeightedHeuristic:
+    # w * h, for plain and incremental heuristics alike.
+    def __init__(self, h, weight):
+        self.h = h
+        self.weight = weight
+
+    def __call__(self, p):
+        return self.weight * self.h(p)
+
+    def key(self, p):
+        return self.h.key(p)
+
+    def update(self, key, p, descr):
+        return self.h.update(key, p, descr)
+
+    def value(self, key):
+        return self.weight * self.h.value(key)
+
+
+class AnytimeIDAStar(SolveMonitor):
+    # Runs engine with decreasing heuristic weights: the first solutions
+    # are at most weight times longer than optimal but come quickly, and
+    # the final weight of 1 proves optimality if h is admissible.  Each
+    # shorter solution is passed to on_solution(path, path_descrs).
+    # Once there is a solution, each phase stops at the bound weight *
+    # (its length - 1): every shorter solution lies within it, so a
+    # phase that finds none there proves the best one optimal.  If the
+    # budget runs out or the solve is cancelled, the best solution so
+    # far is returned, with self.optimal left False.
+    def __init__(self, engine, weights=(5, 3, 2, 1.5, 1.2, 1)):
+        self.engine = engine
+        self.weights = weights
+
+    def solve(self, root, is_goal, max_cost=None, on_solution=None,
+              **watch):
+        self._watch(**watch)
+        h = self.engine.h
+        pack = getattr(self.engine, 'pack', None)
+        lower_bound = h(root if pack is None else pack(root))
+        best = None
+        self.nodes_evaluated = 0
+        self.optimal = False
+        try:
+            for weight in self.weights:
+                self.engine.h = h if weight == 1 else \
+                    WeightedHeuristic(h, weight)
+                self.bound = weight
+                phase = dict(watch)
+                if self.deadline is not None:
+                    phase['time_limit'] = self.deadline - time.monotonic()
+                # The budgets cover the whole solve, not each phase.
+                if self.node_limit is not None:
+                    phase['node_limit'] = \
+                        self.node_limit - self.nodes_evaluated
+                    if phase['node_limit'] <= 0:
+                        raise SolveTimeout('node budget exceeded')
+                limit = max_cost
+                if best is not None and (limit is None or
+                                         len(best[1]) - 1 < limit):
+                    limit = len(best[1]) - 1
+                try:
+                    r = self.engine.solve(
+                        root, is_goal,
+                        None if limit is None else weight * limit, **phase)
+                finally:
+                    self.nodes_evaluated += self.engine.nodes_evaluated
+                if r is None:
+                    if best is not None:
+                        self.optimal = True
+                        break
+                    return None
+                if best is None or len(r[1]) < len(best[1]):
+                    best = r[0], r[1], len(r[1]), self.nodes_evaluated
+                    if on_solution is not None:
+                        on_solution(best[0], best[1])
+                if weight == 1 or len(best[1]) <= lower_bound:
+                    self.optimal = True
+                    break
+        except SolveCancelled:
+            if best is None:
+                raise
+        finally:
+            self.engine.h = h
+        return best[0], best[1], best[2], self.nodes_evaluated
+
+
 def slide_solved_state(n):
     return tuple(i % (n * n) for i in range(1, n * n + 1))
 
 
+class Perimeter:
+    # Every board within depth moves of the solved state, with its exact
+    # distance and the blank move that leads one step closer.
+    def __init__(self, n, depth):
+        self.n = n
+        self.depth = depth
+        goal = slide_solved_state(n)
+        neighbours = slide_neighbours(n)
+        self.dist = {goal: 0}
+        self.next = {goal: None}
+        layer = [goal]
+        for d in range(1, depth + 1):
+            next_layer = []
+            for p in layer:
+                for _, c, (_, m) in neighbours(p):
+                    if c not in self.dist:
+                        self.dist[c] = d
+                        self.next[c] = -m
+                        next_layer.append(c)
+            layer = next_layer
+
+    def path_to_goal(self, p):
+        l = list(p)
+        m = self.next[p]
+        while m is not None:
+            gap = l.index(0)
+            l[gap], l[gap + m] = l[gap + m], 0
+            p = tuple(l)
+            yield p, (l[gap], m)
+            m = self.next[p]
+
+
+_perimeters = {}
+
+
+def slide_perimeter(n, depth=10):
+    if (n, depth) not in _perimeters:
+        _perimeters[n, depth] = Perimeter(n, depth)
+    return _perimeters[n, depth]
+
+
+def slide_permutation_parity(p):
+    # Parity of the permutation from the solved state to p, blank included,
+    # counted over its cycles in linear time.
+    size = len(p)
+    seen = [False] * size
+    parity = 0
+    for i in range(size):
+        length = 0
+        while not seen[i]:
+            seen[i] = True
+            i = (p[i] - 1) % size
+            length += 1
+        if length:
+            parity ^= (length - 1) & 1
+    return parity
+
+
+def slide_is_solvable(p):
+    # Every move is one transposition and moves the blank one cell, so the
+    # permutation's parity must match the parity of the blank's distance
+    # from its goal cell.
+    n = int(len(p) ** 0.5)
+    gap = p.index(0)
+    return slide_permutation_parity(p) == \
+        (n - 1 - gap % n + n - 1 - gap // n) % 2
+
+
 def slide_neighbours(n):
     movelist = []
     for gap in range(n * n):
@@ -87,57 +772,208 @@ def slide_neighbours(n):
     return neighbours
 
 
+# Packed boards: tile i lives in nibble i, and the blank's index is kept in
+# the bits above the board, so a 4x4 node is a single int.
+def slide_pack(p):
+    x = 0
+    for i, c in enumerate(p):
+        x |= c << (i << 2)
+    return x | p.index(0) << (len(p) << 2)
+
+
+def slide_unpack(x, n):
+    return tuple((x >> (i << 2)) & 15 for i in range(n * n))
+
+
+def slide_packed_neighbours(n):
+    assert n <= 4
+    movelist = []
+    for gap in range(n * n):
+        x, y = gap % n, gap // n
+        moves = []
+        if x > 0:
+            moves.append(-1)
+        if x < n - 1:
+            moves.append(+1)
+        if y > 0:
+            moves.append(-n)
+        if y < n - 1:
+            moves.append(+n)
+        movelist.append(moves)
+    shift = n * n << 2
+    mask = (1 << shift) - 1
+
+    def neighbours(p):
+        gap = p >> shift
+        board = p & mask
+        for m in movelist[gap]:
+            s = (gap + m) << 2
+            c = (board >> s) & 15
+            yield (1, (board ^ (c << s) ^ (c << (gap << 2))) |
+                   (gap + m) << shift, (c, m))
+
+    return neighbours
+
+
+def wd_weights(n):
+    # A WD configuration counts, for each current row, the tiles of each
+    # goal row.  The last row follows from the goal-row totals, so only the
+    # first n - 1 rows are encoded, as base n + 1 digits.
+    return [(n + 1) ** i if i < n * (n - 1) else 0 for i in range(n * n)]
+
+
 def encode_cfg(cfg, n):
     r = 0
-    b = n.bit_length()
-    for i in range(len(cfg)):
-        r |= cfg[i] << (b * i)
+    for c, w in zip(cfg, wd_weights(n)):
+        r += c * w
     return r
 
 
 def gen_wd_table(n):
+    # Breadth-first over the packed configuration codes, one level at a
+    # time.  Every move shifts the blank one row, so a level's neighbours
+    # lie only in the levels either side of it: only those are kept as
+    # sets, finished levels as sorted arrays merged into the table at the
+    # end.  There are 105 configurations for n = 3 and 24964 for n = 4,
+    # but 65.6M for n = 5 (a ~600 MB table) and 2.1e12 for n = 6.
+    if not 2 <= n <= 4:
+        raise ValueError(f'walking distance tables are built for 2x2 to '
+                         f'4x4 boards, not {n}x{n}')
+    w = wd_weights(n)
+    base = n + 1
+    coded = n * (n - 1)
+    # Tiles per goal row; the blank belongs to the last.
+    totals = [n] * (n - 1) + [n - 1]
     goal = [[0] * i + [n] + [0] * (n - 1 - i) for i in range(n)]
     goal[-1][-1] = n - 1
-    goal = tuple(sum(goal, []))
-
-    table = {}
-    to_visit = [(goal, 0, n - 1)]
-    while to_visit:
-        cfg, cost, e = to_visit.pop(0)
-        enccfg = encode_cfg(cfg, n)
-        if enccfg in table:
-            continue
-        table[enccfg] = cost
-
-        for d in [-1, 1]:
-            if 0 <= e + d < n:
-                for c in range(n):
-                    if cfg[n * (e + d) + c] > 0:
-                        ncfg = list(cfg)
-                        ncfg[n * (e + d) + c] -= 1
-                        ncfg[n * e + c] += 1
-                        to_visit.append((tuple(ncfg), cost + 1, e + d))
-    return table
-
-
-def slide_wd(n, goal):
-    wd = gen_wd_table(n)
-    goals = {i: goal.index(i) for i in goal}
-    b = n.bit_length()
-
-    def h(p):
+
+    levels = []
+    prev, level = set(), {encode_cfg(sum(goal, []), n)}
+    while level:
+        levels.append(array('Q', sorted(level)))
+        next_level = set()
+        for k in level:
+            cfg = []
+            r = k
+            for _ in range(coded):
+                r, c = divmod(r, base)
+                cfg.append(c)
+            cfg += [totals[c] - sum(cfg[c:coded:n]) for c in range(n)]
+            e = 0
+            while sum(cfg[n * e:n * e + n]) == n:
+                e += 1
+            for d in (-1, 1):
+                if 0 <= e + d < n:
+                    for c in range(n):
+                        if cfg[n * (e + d) + c] > 0:
+                            enccfg = k + w[n * e + c] - w[n * (e + d) + c]
+                            if enccfg not in prev:
+                                next_level.add(enccfg)
+        prev, level = level, next_level
+
+    keys = array('Q')
+    dist = bytearray()
+    for k, d in heapq.merge(*(zip(l, repeat(d))
+                              for d, l in enumerate(levels))):
+        keys.append(k)
+        dist.append(d)
+    return WDTable(keys, bytes(dist))
+
+
+class WDTable:
+    # Distances stored densely by rank, the rank being the position of the
+    # configuration's code in the sorted keys.
+    def __init__(self, keys, dist):
+        self.keys = keys
+        self.dist = dist
+
+    def __len__(self):
+        return len(self.dist)
+
+    def __getitem__(self, enccfg):
+        i = bisect_left(self.keys, enccfg)
+        if i == len(self.keys) or self.keys[i] != enccfg:
+            raise KeyError(enccfg)
+        return self.dist[i]
+
+    def save(self, path):
+        width = (int(self.keys[-1]).bit_length() + 7) // 8
+        def write(f):
+            f.write(len(self.dist).to_bytes(8, 'little'))
+            f.write(width.to_bytes(8, 'little'))
+            f.write(self.dist)
+            for k in self.keys:
+                f.write(k.to_bytes(width, 'little'))
+        write_cache_file(path, write)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            size = int.from_bytes(f.read(8), 'little')
+            width = int.from_bytes(f.read(8), 'little')
+            dist = f.read(size)
+            data = f.read(size * width)
+        keys = [int.from_bytes(data[i:i + width], 'little')
+                for i in range(0, len(data), width)]
+        if width <= 8:
+            keys = array('Q', keys)
+        return cls(keys, dist)
+
+
+_wd_tables = {}
+
+
+def load_wd_table(n):
+    if n not in _wd_tables:
+        path = cache_path(f'wd-{n}.bin')
+        if os.path.exists(path):
+            table = WDTable.load(path)
+        else:
+            table = gen_wd_table(n)
+            table.save(path)
+        _wd_tables[n] = table
+    return _wd_tables[n]
+
+
+class SlideWD:
+    # Walking distance plus linear conflicts.  The sum can overestimate,
+    # so solutions are not always optimal; with conflicts=False h is the
+    # walking distance alone, which is admissible but weaker.
+    def __init__(self, n, goal, conflicts=True):
+        self.n = n
+        self.conflicts = conflicts
+        table = load_wd_table(n)
+        # Small tables are cheaper to probe through a dict than by bisection.
+        if len(table) <= 1 << 16:
+            self.wd = dict(zip(table.keys, table.dist))
+        else:
+            self.wd = table
+        self.goal = tuple(goal)
+        self.goals = {i: goal.index(i) for i in goal}
+        self.w = wd_weights(n)
+
+    def __call__(self, p):
+        return self.value(self.key(p))
+
+    def key(self, p):
+        n, w, goals = self.n, self.w, self.goals
+        conflicts = self.conflicts
         ht = 0
         vt = 0
         d = 0
+        gap = None
         for i, c in enumerate(p):
             if c == 0:
+                gap = i
                 continue
             g = goals[c]
             xi, yi = i % n, i // n
             xg, yg = g % n, g // n
-            ht += 1 << (b * (n * yi + yg))
-            vt += 1 << (b * (n * xi + xg))
+            ht += w[n * yi + yg]
+            vt += w[n * xi + xg]
 
+            if not conflicts:
+                continue
             if yg == yi:
                 for k in range(i + 1, i - i % n + n):
                     if p[k] and goals[p[k]] // n == yi and goals[p[k]] < g:
@@ -146,6 +982,78 @@ def slide_wd(n, goal):
                 for k in range(i + n, n * n, n):
                     if p[k] and goals[p[k]] % n == xi and goals[p[k]] < g:
                         d += 2
-        d += wd[ht] + wd[vt]
+        return ht, vt, d, gap
+
+    def value(self, key):
+        return self.wd[key[0]] + self.wd[key[1]] + key[2]
+
+    def update(self, key, p, descr):
+        # p is the child board, descr the (tile, move) that produced it:
+        # tile c slid from gap + m into gap.  Only c's row (vertical move)
+        # or column (horizontal move) changes, so only the two lines it
+        # leaves and enters need their conflicts recounted.
+        n, w = self.n, self.w
+        ht, vt, d, gap = key
+        c, m = descr
+        src = gap + m
+        g = self.goals[c]
+        if m == 1 or m == -1:
+            xg = g % n
+            vt += w[n * (gap % n) + xg] - w[n * (src % n) + xg]
+            if self.conflicts:
+                d -= self._conflicts(p, c, g, src % n, gap // n, 1, n)
+                d += self._conflicts(p, c, g, gap % n, gap // n, 1, n)
+        else:
+            yg = g // n
+            ht += w[n * (gap // n) + yg] - w[n * (src // n) + yg]
+            if self.conflicts:
+                d -= self._conflicts(p, c, g, src // n, gap % n, n, 1)
+                d += self._conflicts(p, c, g, gap // n, gap % n, n, 1)
+        return ht, vt, d, src
+
+    def _conflicts(self, p, c, g, line, at, step, stride):
+        # Linear conflicts of tile c (goal g) at index `at` of a row
+        # (step=n, stride=1) or column (step=1, stride=n).
+        n, goals = self.n, self.goals
+        if (g // step) % n != line:
+            return 0
+        d = 0
+        base = line * step
+        for j in range(n):
+            if j == at:
+                continue
+            t = p[base + j * stride]
+            if t and t != c:
+                gt = goals[t]
+                if (gt // step) % n == line and (gt < g) == (j > at):
+                    d += 2
+        return d
+
+
+class PackedSlideWD(SlideWD):
+    def key(self, p):
+        return super().key(slide_unpack(p, self.n))
+
+    def _conflicts(self, p, c, g, line, at, step, stride):
+        n, goals = self.n, self.goals
+        if (g // step) % n != line:
+            return 0
+        d = 0
+        base = line * step
+        for j in range(n):
+            if j == at:
+                continue
+            t = (p >> ((base + j * stride) << 2)) & 15
+            if t and t != c:
+                gt = goals[t]
+                if (gt // step) % n == line and (gt < g) == (j > at):
+                    d += 2
         return d
-    return h
+
+
+def slide_wd(n, goal, conflicts=True):
+    return SlideWD(n, goal, conflicts)
+
+
+def slide_packed_wd(n, goal):
+    return PackedSlideWD(n, goal)